@@ -1,184 +1,100 @@
-import sqlite3
+import os
 import time
 import tkinter as tk
 from tkinter import messagebox
-import cv2
-import mediapipe as mp
-import numpy as np
 import sys
 import threading
-import serial
-import serial.tools.list_ports
+from frame_pipeline import StageStats
+from inference_process import InferenceProcess
+from metrics import metrics
+from posture_db import DAY, PostureLogWriter, connect, get_user_ranking
+from posture_history import history, trend
 
-mp_holistic = mp.solutions.holistic
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+# Heavy modules (mediapipe, cv2, pyserial) are only imported by the inference
+# process or on first use, so the login window appears straight away.
+LAUNCHED_AT = time.time()
 
-camera_active = False
-global_frame = None
-global_frame_with_landmarks = None
-webcam_thread = None
-camera_lock = threading.Lock()
+# "pose" runs the body model alone; "holistic" also runs face and hand models.
+POSE_BACKEND = "pose"
+POSE_MODEL_COMPLEXITY = 1
 
-def distance(v1, v2):
-    return np.sqrt(((v1 - v2) ** 2).sum())
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+PIPELINE_REPORT_INTERVAL = 10.0  # seconds
 
+# Crop the model input to the tracked person and scale it to hit this rate.
+ROI_TRACKING = True
+TARGET_INFERENCE_FPS = 15.0
 
-def find_angles(vec1, vec2, vec3):
+# Instrumentation is off unless POSTURE_METRICS or POSTURE_METRICS_PORT is set.
+METRICS_PORT = int(os.environ.get("POSTURE_METRICS_PORT", "0"))
+METRICS_LOG_INTERVAL = 60.0  # seconds
 
-    vec1 = np.array(vec1)
-    vec2 = np.array(vec2)
-    vec3 = np.array(vec3)
-
-    vec21 = vec1 - vec2
-    vec23 = vec3 - vec2
-
-    dist_vec21 = distance(vec1, vec2)
-    dist_vec23 = distance(vec3, vec2)
-
-    if dist_vec21 == 0 or dist_vec23 == 0:
-        return 0
-
-    angle = np.degrees(np.arccos(np.dot(vec21, vec23) / (dist_vec21 * dist_vec23)))
-    return angle
-
-
-def camera_thread_function():
-
-    global global_frame, global_frame_with_landmarks, camera_active
-
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("Error: Could not open webcam.")
-        camera_active = False
-        return
-
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-    with mp_holistic.Holistic(min_detection_confidence=0.5,
-                              min_tracking_confidence=0.5) as holistic:
-        while camera_active:
-            ret, frame = cap.read()
-            if ret:
-                with camera_lock:
-                    global_frame = frame.copy()
-
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = holistic.process(rgb_frame)
-
-                annotated_frame = frame.copy()
-                if results.pose_landmarks:
-                    mp_drawing.draw_landmarks(
-                        annotated_frame,
-                        results.pose_landmarks,
-                        mp_holistic.POSE_CONNECTIONS,
-                        mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                        mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2)
-                    )
-
-                with camera_lock:
-                    global_frame_with_landmarks = annotated_frame
-            else:
-                print("Warning: Could not read frame from webcam.")
-                time.sleep(0.1)
-
-    cap.release()
-    print("Camera released")
+# When set, every frame's landmarks are recorded under this directory so
+# sessions can be re-classified later without video or inference.
+LANDMARK_RECORD_DIR = os.environ.get("POSTURE_RECORD_DIR")
 
+# Capture, inference and annotation run in a separate process that shares
+# its latest frame and pose result with the GUI through shared memory.
+inference_process = None
+pipeline_stats = StageStats(forward=metrics.observe if metrics.enabled else None)
 
 def start_camera():
-    global camera_active, webcam_thread
-
-    if not camera_active:
-        camera_active = True
-        webcam_thread = threading.Thread(target=camera_thread_function)
-        webcam_thread.daemon = True
-        webcam_thread.start()
-        print("Camera thread started")
-        time.sleep(1)
+    global inference_process
+
+    if inference_process is None:
+        # The frame scheduler in the inference process lowers decode,
+        # inference and polling rates while the user is still or away.
+        inference_process = InferenceProcess((FRAME_HEIGHT, FRAME_WIDTH, 3), stats=pipeline_stats,
+                                             backend=POSE_BACKEND, model_complexity=POSE_MODEL_COMPLEXITY,
+                                             roi_tracking=ROI_TRACKING, target_fps=TARGET_INFERENCE_FPS,
+                                             record_dir=LANDMARK_RECORD_DIR,
+                                             report_interval=PIPELINE_REPORT_INTERVAL)
+        for name in ("dropped_frames", "failed_reads", "frames_without_pose"):
+            metrics.gauge(name, lambda name=name, process=inference_process: process.counters.get(name, 0))
+        # Export how long GUI reads wait for the child on the shared buffer lock.
+        inference_process.buffer.lock = metrics.lock("shared_buffer_lock", inference_process.buffer.lock)
+        inference_process.start()
+        print("Inference process started")
 
 
 def stop_camera():
-    global camera_active, webcam_thread
-
-    if camera_active:
-        camera_active = False
-        if webcam_thread is not None:
-            webcam_thread.join(timeout=2.0)
-            print("Camera thread stopped")
-
+    global inference_process
 
-def analyze_posture(frame):
-    if frame is None:
-        return False
+    if inference_process is not None:
+        inference_process.stop()
+        inference_process = None
+        print("Inference process stopped")
 
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    with mp_holistic.Holistic(min_detection_confidence=0.5,
-                              min_tracking_confidence=0.5) as holistic:
-        results = holistic.process(rgb_frame)
 
-    if not results or not results.pose_landmarks:
+def get_pose_status():
+    if inference_process is None:
+        print("Warning: Inference process is not running.")
         return False
 
-    try:
-        landmarks = results.pose_landmarks.landmark
-        leftKnee = [landmarks[mp_holistic.PoseLandmark.LEFT_KNEE.value].x,
-                    landmarks[mp_holistic.PoseLandmark.LEFT_KNEE.value].y]
-        leftHip = [landmarks[mp_holistic.PoseLandmark.LEFT_HIP.value].x,
-                   landmarks[mp_holistic.PoseLandmark.LEFT_HIP.value].y]
-        leftShoulder = [landmarks[mp_holistic.PoseLandmark.LEFT_SHOULDER.value].x,
-                        landmarks[mp_holistic.PoseLandmark.LEFT_SHOULDER.value].y]
-        leftEar = [landmarks[mp_holistic.PoseLandmark.LEFT_EAR.value].x,
-                   landmarks[mp_holistic.PoseLandmark.LEFT_EAR.value].y]
-
-        if any(l is None for l in (leftKnee + leftHip + leftShoulder + leftEar)):
-            return False
-    except:
+    inference_process.poll_events()
+    pose_result = inference_process.latest_result()
+    if pose_result is None:
+        print("Warning: No pose result available for posture detection.")
         return False
 
-    virtualPoint = [leftEar[0], leftEar[1] - 0.1]
-    angleKHS = find_angles(leftKnee, leftHip, leftShoulder)
-    angleHSE = find_angles(leftHip, leftShoulder, leftEar)
-    angleSEV = find_angles(leftShoulder, leftEar, virtualPoint)
-
-    validKHS = (65 <= angleKHS <= 110)
-    validHSE = (angleHSE >= 160)
-    validSEV = (angleSEV >= 160)
-
-    if validKHS and validHSE and validSEV:
-        return False
-    else:
-        return True
-
-
-def get_pose_status():
-    global global_frame
-    with camera_lock:
-        if global_frame is not None:
-            current_frame = global_frame.copy()
-        else:
-            print("Warning: No frame available for posture detection.")
-            return False
-
-    return analyze_posture(current_frame)
+    return pose_result.slouch
 
 class PostureTestApp:
     def __init__(self, db_filename="posture_data.db"):
-        self.conn = sqlite3.connect(db_filename)
+        # The pose model loads in the background while the user logs in.
+        start_camera()
+        self.conn = connect(db_filename)
         self.cursor = self.conn.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS posture_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT,
-                timestamp TEXT,
-                status TEXT,
-                duration REAL DEFAULT 0.0
-            )
-        ''')
-        self.conn.commit()
-
-        self.init_serial()
+        self.db_writer = PostureLogWriter(db_filename, stats=pipeline_stats)
+        metrics.gauge("db_records_written", lambda: self.db_writer.written)
+        if metrics.enabled:
+            if METRICS_PORT:
+                metrics.serve(METRICS_PORT)
+            metrics.start_logging(METRICS_LOG_INTERVAL)
+
+        self.serial_channel = None
+        threading.Thread(target=self.init_serial, daemon=True).start()
 
         # Tkinter login window
         self.root = tk.Tk()
@@ -190,37 +106,30 @@ class PostureTestApp:
 
         self.username = None
 
-        # Start the camera
-        start_camera()
-
     def init_serial(self):
-        ports = list(serial.tools.list_ports.comports())
-        if not ports:
-            print("No serial ports found. Arduino integration disabled.")
-            self.serial_inst = None
-            return
+        # Runs on a background thread. The Arduino is found by its USB ids, or
+        # POSTURE_SERIAL_PORT names the port ("none" disables it).
+        from serial_channel import SerialChannel, find_arduino_port
 
-        print("Available serial ports:")
-        for i, port in enumerate(ports):
-            print(f"{i}: {port.device}")
         try:
-            selection = input("Select the index for the Arduino port: ")
-            index = int(selection)
-            chosen_port = ports[index].device
-            self.serial_inst = serial.Serial(chosen_port, 9600, timeout=1)
-            print(f"Using Arduino port: {chosen_port}")
+            port = find_arduino_port()
+            if port is None:
+                print("No Arduino found (set POSTURE_SERIAL_PORT to choose a port). Arduino integration disabled.")
+                return
+            channel = SerialChannel(port, 9600, stats=pipeline_stats)
         except Exception as e:
-            print("Error selecting serial port:", e)
-            self.serial_inst = None
+            print("Error opening serial port:", e)
+            return
+        metrics.gauge("serial_commands_sent", lambda: channel.commands_sent)
+        metrics.gauge("serial_reconnects", lambda: channel.reconnects)
+        self.serial_channel = channel
+        print(f"Using Arduino port: {port}")
 
     def send_serial_command(self, status):
-        if self.serial_inst:
-            command = "BP\n" if status == "Slouch Detected" else "GP\n"
-            try:
-                self.serial_inst.write(command.encode('utf-8'))
-                print(f"Sent command: {command.strip()}")
-            except Exception as e:
-                self.log_message("Serial command error: " + str(e))
+        # Non-blocking: the channel only transmits state changes and heartbeats.
+        if self.serial_channel:
+            from serial_channel import BAD_POSTURE_COMMAND, GOOD_POSTURE_COMMAND
+            self.serial_channel.send(BAD_POSTURE_COMMAND if status == "Slouch Detected" else GOOD_POSTURE_COMMAND)
 
     def start_test(self):
         entered_username = self.username_entry.get().strip()
@@ -277,13 +186,15 @@ class PostureTestApp:
         self.preview_button.pack(side=tk.LEFT, padx=5)
 
         self.preview_canvas = tk.Canvas(main_frame, width=320, height=240, bg="black")
+        self.preview_renderer = None  # created on first show, so cv2 is only imported if needed
+        self.first_verdict = False
 
         self.last_status = None
         self.last_status_change_time = time.time()
+        self.last_poll_time = self.last_status_change_time
         self.good_posture_time = 0.0
         self.slouch_time = 0.0
         self.start_time = time.time()
-        self.update_interval = 2000  # milliseconds
 
         self.log_message("Posture monitoring started")
         self.test_window.after(100, self.update_test)
@@ -297,51 +208,80 @@ class PostureTestApp:
             self.preview_button.config(text="Show Camera Preview")
             self.preview_active = False
         else:
+            if self.preview_renderer is None:
+                from preview_renderer import PreviewRenderer
+                self.preview_renderer = PreviewRenderer(self.preview_canvas, 320, 240)
             self.preview_canvas.pack(pady=10)
             self.preview_button.config(text="Hide Camera Preview")
             self.preview_active = True
+        if inference_process is not None:
+            inference_process.set_annotation(self.preview_active)
 
     def update_preview(self):
-        self.preview_canvas.delete("all")
-        if hasattr(self, 'preview_active') and self.preview_active and camera_active:
-            with camera_lock:
-                if global_frame_with_landmarks is not None:
-                    preview_frame = cv2.resize(global_frame_with_landmarks, (320, 240))
-                    preview_rgb = cv2.cvtColor(preview_frame, cv2.COLOR_BGR2RGB)
-                    self.photo = tk.PhotoImage(data=cv2.imencode('.png', preview_rgb)[1].tobytes())
-                    self.preview_canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
-        if hasattr(self, 'test_window'):
-            self.test_window.after(100, self.update_preview)
+        if self.preview_active and inference_process is not None:
+            # Maps the newest annotated frame in shared memory; the inference
+            # process does not touch it until the next one is mapped.
+            last_seq = self.preview_renderer.last_seq
+            item = inference_process.latest_frame(-1 if last_seq is None else last_seq)
+            if item is not None:
+                frame_seq, frame = item
+                started = time.perf_counter()
+                if self.preview_renderer.render(frame, frame_seq):
+                    pipeline_stats.record("preview", time.perf_counter() - started)
+        self.test_window.after(100, self.update_preview)
+
+    def wait_for_first_verdict(self):
+        # Polls quickly until the inference process publishes its first result;
+        # until then no posture time is counted.
+        inference_process.poll_events()
+        if inference_process.latest_result() is not None:
+            elapsed = time.time() - LAUNCHED_AT
+            metrics.observe("time_to_first_verdict", elapsed)
+            print(f"First verdict {elapsed:.2f}s after launch")
+            self.log_message(f"Camera ready ({elapsed:.1f}s after launch)")
+            self.first_verdict = True
+            self.last_status_change_time = self.last_poll_time = time.time()
+            return True
+        if inference_process.error:
+            self.status_label.config(text=f"Status: Camera unavailable ({inference_process.error})", fg="red")
+        elif not inference_process.is_alive():
+            self.status_label.config(text="Status: Camera unavailable", fg="red")
+        else:
+            self.status_label.config(text="Status: Starting camera...")
+        self.test_window.after(100, self.update_test)
+        return False
 
     def update_test(self):
+        if not self.first_verdict and not self.wait_for_first_verdict():
+            return
         slouch_detected = get_pose_status()
         current_status = "Slouch Detected" if slouch_detected else "Good Posture"
         now = time.time()
         duration = now - self.last_status_change_time
+        # The poll interval follows the scheduler mode, so the totals grow by
+        # the time since the last poll, not since the last status change.
+        elapsed = now - self.last_poll_time
+        self.last_poll_time = now
 
         if self.last_status is not None:
             if self.last_status == "Good Posture":
-                self.good_posture_time += duration
+                self.good_posture_time += elapsed
             else:
-                self.slouch_time += duration
+                self.slouch_time += elapsed
             self.update_time_labels()
 
         if current_status != self.last_status:
             color = "red" if slouch_detected else "green"
             self.status_label.config(text=f"Status: {current_status}", fg=color)
             self.log_message(f"Status changed to: {current_status}")
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
             if self.last_status is not None:
-                self.insert_into_db(timestamp, self.last_status, duration)
+                self.insert_into_db(now, self.last_status, duration)
             self.last_status = current_status
             self.last_status_change_time = now
             self.send_serial_command(current_status)
-        else:
 
-            if current_status == "Slouch Detected":
-                self.send_serial_command(current_status)
-
-        self.test_window.after(self.update_interval, self.update_test)
+        poll_interval_ms = inference_process.poll_interval_ms() if inference_process is not None else 500
+        self.test_window.after(poll_interval_ms, self.update_test)
 
     def update_time_labels(self):
         self.good_time_label.config(text=f"Good Posture Time: {self.good_posture_time:.1f}s")
@@ -351,16 +291,10 @@ class PostureTestApp:
             ratio = (self.good_posture_time / total_time) * 100
             self.ratio_label.config(text=f"Good Posture Ratio: {ratio:.1f}%")
 
-    def insert_into_db(self, timestamp, status, duration):
-        try:
-            self.cursor.execute(
-                "INSERT INTO posture_log (username, timestamp, status, duration) VALUES (?, ?, ?, ?)",
-                (self.username, timestamp, status, duration)
-            )
-            self.conn.commit()
-            self.log_message(f"Record inserted: {status} for {duration:.1f}s")
-        except Exception as e:
-            self.log_message(f"DB insert error: {e}")
+    def insert_into_db(self, ended_at, status, duration):
+        # Queued for the background writer so the commit never blocks Tk.
+        self.db_writer.log(self.username, ended_at, status, duration)
+        self.log_message(f"Record logged: {status} for {duration:.1f}s")
 
     def log_message(self, message):
         timestamp = time.strftime("%H:%M:%S")
@@ -368,44 +302,28 @@ class PostureTestApp:
         self.log_text.see(tk.END)
 
     def generate_report(self):
+        self.db_writer.flush()
         try:
-            self.cursor.execute('''
-                SELECT username,
-                       SUM(CASE WHEN status = 'Good Posture' THEN duration ELSE 0 END) AS good_time,
-                       SUM(duration) AS total_time
-                FROM posture_log
-                GROUP BY username
-            ''')
-            user_data = self.cursor.fetchall()
+            ranking = get_user_ranking(self.conn, self.username)
+            now = time.time()
+            week = history(self.conn, DAY, now - 7 * 86400, now, self.username)
         except Exception as e:
             self.log_message(f"Error generating report: {e}")
             return
 
-        if not user_data:
-            self.log_message("No data available for report.")
-            return
-
-        user_scores = []
-        for user, good_time, total_time in user_data:
-            ratio = (good_time / total_time * 100) if total_time > 0 else 0
-            user_scores.append((user, ratio))
-
-        user_scores.sort(key=lambda x: x[1], reverse=True)
-        rank = None
-        current_ratio = 0
-        for idx, (user, ratio) in enumerate(user_scores, start=1):
-            if user == self.username:
-                rank = idx
-                current_ratio = ratio
-                break
-        if rank is None:
+        if ranking is None:
             self.log_message("No data for current user.")
             return
 
-        total_users = len(user_scores)
+        current_ratio, rank, total_users = ranking
         percentage_beat = ((total_users - rank + 1) / total_users) * 100
         total_session_time = self.good_posture_time + self.slouch_time
         session_ratio = (self.good_posture_time / total_session_time * 100) if total_session_time > 0 else 0
+        week_good = sum(day.good_time for day in week)
+        week_total = week_good + sum(day.slouch_time for day in week)
+        week_ratio = (week_good / week_total * 100) if week_total > 0 else 0
+        slope = trend(week, DAY)
+        week_trend = f" ({slope:+.1f} points/day)" if slope is not None else ""
 
         report_window = tk.Toplevel(self.test_window)
         report_window.title("Posture Report")
@@ -417,7 +335,8 @@ class PostureTestApp:
             f"  Session Ratio: {session_ratio:.2f}%\n\n"
             f"Overall Stats:\n"
             f"  Overall Good Posture Ratio: {current_ratio:.2f}%\n"
-            f"  Your ranking percentile: {percentage_beat:.2f}%\n\n"
+            f"  Your ranking percentile: {percentage_beat:.2f}%\n"
+            f"  Last 7 Days Ratio: {week_ratio:.2f}%{week_trend}\n\n"
             f"(Best performer always gets 100%, and rankings are relative among all users.)"
         )
         tk.Label(report_window, text=report_message, font=("Arial", 14), justify=tk.LEFT).pack(padx=20, pady=20)
@@ -426,12 +345,12 @@ class PostureTestApp:
         now = time.time()
         duration = now - self.last_status_change_time
         if self.last_status is not None:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            self.insert_into_db(timestamp, self.last_status, duration)
+            self.insert_into_db(now, self.last_status, duration)
 
         stop_camera()
-        if hasattr(self, 'serial_inst') and self.serial_inst is not None and self.serial_inst.is_open:
-            self.serial_inst.close()
+        if self.serial_channel is not None:
+            self.serial_channel.close()
+        self.db_writer.close()
         self.conn.close()
         self.test_window.destroy()
         sys.exit(0)
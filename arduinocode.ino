@@ -1,48 +1,93 @@
-// Include the Servo library 
+// Include the Servo library
  #include <Servo.h>
- // Declare the Servo pin 
+ // Declare the Servo pin
  const int servoPin = 3;
- 
+
  // Buzzer pin
- const int buzzerPin = 8; 
- 
- // Create a servo object 
- Servo ServoArm; 
- 
+ const int buzzerPin = 8;
+
+ // How often the arm swings while bad posture persists, and how long it
+ // stays out on each swing (milliseconds)
+ const unsigned long swingInterval = 2000;
+ const unsigned long swingHold = 1000;
+
+ // Create a servo object
+ Servo ServoArm;
+
+ // Current state, driven by the host which only sends state changes
+ bool badPosture = false;
+ bool armOut = false;
+ unsigned long lastSwing = 0;
+ String inputLine = "";
+
  void setup() {
    // put your setup code here, to run once:
    Serial.begin(9600);
    pinMode(buzzerPin,OUTPUT);
    ServoArm.detach();
    ServoArm.attach(servoPin);
+   ServoArm.write(90);
+   inputLine.reserve(16);
  }
- 
+
+ void handleCommand(String msg) {
+   if (msg=="BP")  //if bad posture
+   {
+     if (!badPosture)
+     {
+       // swing straight away, then every swingInterval
+       badPosture = true;
+       lastSwing = millis() - swingInterval;
+     }
+   }
+   else
+   {
+     // GP or anything unknown: back to rest
+     badPosture = false;
+     armOut = false;
+     ServoArm.write(90);
+   }
+   // acknowledge so the host knows the command arrived
+   Serial.print("ACK ");
+   Serial.println(msg);
+ }
+
  void loop() {
    // put your main code here, to run repeatedly:
-     if (Serial.available() > 0)
+   // read commands without blocking so they never queue up behind the servo
+   while (Serial.available() > 0)
+   {
+     char c = Serial.read();
+     if (c == '\n')
      {
-       String msg = Serial.readStringUntil('\n');
-       msg.trim();
-       if (msg=="BP")  //if bad posture
-       {
-         // swing arm around 
-         // Make servo go to 40 degrees 
-         ServoArm.write(40); 
-         delay(1000); 
-         // Make servo go to 90 degrees 
-         ServoArm.write(90); 
-         delay(1000); 
-       }
-       else if (msg=="GP")
-       {
-        ServoArm.write(90);
-        delay(1000);
-       }
-       else
+       inputLine.trim();
+       if (inputLine.length() > 0)
        {
-        ServoArm.write(90);
-        delay(1000);
+         handleCommand(inputLine);
        }
+       inputLine = "";
+     }
+     else if (inputLine.length() < 15)
+     {
+       inputLine += c;
+     }
+   }
+
+   unsigned long now = millis();
+   if (badPosture)
+   {
+     if (!armOut && now - lastSwing >= swingInterval)
+     {
+       // Make servo go to 40 degrees
+       ServoArm.write(40);
+       armOut = true;
+       lastSwing = now;
+     }
+     else if (armOut && now - lastSwing >= swingHold)
+     {
+       // Make servo go to 90 degrees
+       ServoArm.write(90);
+       armOut = false;
      }
- 
+   }
  }
@@ -0,0 +1,176 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from pose_estimator import NUM_LANDMARKS, create_pose_estimator
+from posture_db import GOOD_POSTURE, SLOUCH_DETECTED, connect, delete_source, insert_log
+from posture_rules import load_rules
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v")
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(VIDEO_EXTENSIONS):
+                        videos.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"Warning: Skipping missing path {path}")
+    return videos
+
+
+def build_segments(offsets, slouch, end_offset):
+    # Collapse consecutive identical verdicts into (offset, status, duration).
+    segments = []
+    if len(offsets) == 0:
+        return segments
+    changes = np.flatnonzero(np.diff(slouch.astype(np.int8))) + 1
+    starts = np.concatenate(([0], changes))
+    ends = np.concatenate((offsets[changes], [end_offset]))
+    for start, end in zip(starts, ends):
+        status = SLOUCH_DETECTED if slouch[start] else GOOD_POSTURE
+        segments.append((float(offsets[start]), status, float(end - offsets[start])))
+    return segments
+
+
+def score_video(path, stride=1, backend="pose", model_complexity=1, rules_path=None):
+    rules = load_rules(rules_path)
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_indices = []
+    landmark_frames = []
+    frame_index = 0
+    started = time.time()
+
+    with create_pose_estimator(backend, model_complexity) as estimator:
+        while True:
+            if frame_index % stride:
+                # grab() skips the decode for frames we do not score.
+                if not cap.grab():
+                    break
+                frame_index += 1
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            landmarks, _ = estimator.estimate(frame)
+            if landmarks is None:
+                landmarks = np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+            frame_indices.append(frame_index)
+            landmark_frames.append(landmarks)
+            frame_index += 1
+    cap.release()
+
+    frame_indices = np.asarray(frame_indices, dtype=np.int64)
+    offsets = frame_indices / fps
+    if landmark_frames:
+        landmark_frames = np.stack(landmark_frames)
+        angles = rules.angles(landmark_frames)
+        slouch = rules.is_slouching(landmark_frames)
+    else:
+        angles = np.empty((0, len(rules)), dtype=np.float32)
+        slouch = np.empty(0, dtype=bool)
+
+    return {
+        "path": path,
+        "fps": fps,
+        "frame_count": frame_index,
+        "frame_indices": frame_indices,
+        "offsets": offsets,
+        "angles": angles,
+        "angle_names": rules.names,
+        "slouch": slouch,
+        "segments": build_segments(offsets, slouch, frame_index / fps),
+        "elapsed": time.time() - started,
+    }
+
+
+def write_result(conn, result, username=None, write_frames=True):
+    path = result["path"]
+    source = os.path.abspath(path)
+    username = username or os.path.splitext(os.path.basename(path))[0]
+    # Recorded files are stamped with their modification time, which is
+    # taken as the end of the session.
+    session_start = os.path.getmtime(path) - result["frame_count"] / result["fps"]
+
+    # Re-scoring a video replaces its earlier results in the same transaction.
+    delete_source(conn, source)
+    insert_log(conn, [(username, session_start + offset + duration, status, duration)
+                      for offset, status, duration in result["segments"]], source=source)
+    if write_frames:
+        # posture_frame_log keeps the three default rule angles by name.
+        columns = [result["angle_names"].index(name) if name in result["angle_names"] else None
+                   for name in ("KHS", "HSE", "SEV")]
+        conn.executemany(
+            "INSERT INTO posture_frame_log (username, source, frame_index, offset, status, "
+            "angle_khs, angle_hse, angle_sev) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(username, source, int(index), float(offset),
+              SLOUCH_DETECTED if slouched else GOOD_POSTURE,
+              *(float(row[i]) if i is not None and np.isfinite(row[i]) else None for i in columns))
+             for index, offset, slouched, row in zip(result["frame_indices"], result["offsets"],
+                                                       result["slouch"], result["angles"])]
+        )
+    conn.commit()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score recorded posture sessions without the GUI.")
+    parser.add_argument("paths", nargs="+", help="Video files or directories to scan for videos")
+    parser.add_argument("--db", default="posture_data.db", help="SQLite database to write to")
+    parser.add_argument("--username", help="Username for every video (default: the video file name)")
+    parser.add_argument("--stride", type=int, default=1, help="Score every Nth frame")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--backend", default="pose", choices=("pose", "holistic"))
+    parser.add_argument("--model-complexity", type=int, default=1, choices=(0, 1, 2))
+    parser.add_argument("--no-frames", action="store_true", help="Only write per-segment rows")
+    parser.add_argument("--rules", help="Posture rules file (default: posture_rules.json)")
+    args = parser.parse_args(argv)
+    if args.stride < 1:
+        parser.error("--stride must be at least 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    videos = find_videos(args.paths)
+    if not videos:
+        print("No videos found.")
+        return 1
+
+    conn = connect(args.db)
+    failures = 0
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(videos))) as pool:
+        futures = {pool.submit(score_video, path, args.stride, args.backend, args.model_complexity, args.rules): path
+                   for path in videos}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error scoring {path}: {e}")
+                failures += 1
+                continue
+            write_result(conn, result, args.username, not args.no_frames)
+            slouch_ratio = result["slouch"].mean() * 100 if len(result["slouch"]) else 0
+            print(f"{path}: {len(result['slouch'])} frames, {len(result['segments'])} segments, "
+                  f"{slouch_ratio:.1f}% slouching ({result['elapsed']:.1f}s)")
+    conn.close()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,329 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from posture_rules import JOINTS, load_rules
+from posture_state import PostureStateEstimator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(REPO_DIR, "benchmarks", "fixtures")
+
+# Run in a fresh interpreter: cold imports of the GUI module and of the pose
+# stack, graph construction and the first verdict on one recorded frame.
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import PosturePolice
+gui_import = time.perf_counter() - started
+from benchmark import load_frames
+from pose_estimator import create_pose_estimator
+from posture_rules import load_rules
+from posture_state import PostureStateEstimator
+frame = load_frames(sys.argv[1], 1)[0]
+with create_pose_estimator(sys.argv[2], int(sys.argv[3])) as estimator:
+    PostureStateEstimator(load_rules()).update(estimator.estimate(frame)[0], 0.0)
+print(json.dumps({"gui_import": gui_import, "first_verdict": time.perf_counter() - started}))
+'''
+
+
+def make_landmark_fixture(frames=900, fps=30.0, seed=0):
+    # A seated side-on person who alternates between upright and slouched
+    # every 5 seconds, with landmark jitter similar to a webcam.
+    rng = np.random.default_rng(seed)
+    knee, hip, shoulder, ear = (JOINTS[joint][0] for joint in ("knee", "hip", "shoulder", "ear"))
+    upright = np.zeros((33, 4), dtype=np.float32)
+    upright[:, 3] = 0.9
+    upright[knee, :3] = (0.70, 0.80, 0.0)
+    upright[hip, :3] = (0.50, 0.80, 0.0)
+    upright[shoulder, :3] = (0.50, 0.50, 0.0)
+    upright[ear, :3] = (0.50, 0.35, 0.0)
+    slouched = upright.copy()
+    slouched[shoulder, :2] = (0.55, 0.52)
+    slouched[ear, :2] = (0.63, 0.40)
+
+    phase = (np.arange(frames) / fps // 5).astype(int) % 2
+    landmarks = np.where(phase[:, None, None] == 1, slouched, upright)
+    landmarks = landmarks + rng.normal(0, 0.005, landmarks.shape).astype(np.float32)
+    landmarks[:, :, 3] = 0.9
+    return landmarks.astype(np.float32)
+
+
+def load_frames(path, limit=None):
+    if path.endswith(".npy"):
+        frames = np.load(path, mmap_mode="r")
+        return frames[:limit] if limit else frames
+
+    import cv2
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise IOError(f"No frames read from {path}")
+    return np.stack(frames)
+
+
+def record_fixtures(video, limit, backend, model_complexity):
+    # Saves frames.npy and landmarks.npy from a real recording so later runs
+    # replay identical input without a webcam.
+    from pose_estimator import NUM_LANDMARKS, create_pose_estimator
+
+    frames = load_frames(video, limit)
+    landmarks = np.full((len(frames), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    with create_pose_estimator(backend, model_complexity) as estimator:
+        for i, frame in enumerate(frames):
+            result, _ = estimator.estimate(frame)
+            if result is not None:
+                landmarks[i] = result
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    np.save(os.path.join(FIXTURE_DIR, "frames.npy"), frames)
+    np.save(os.path.join(FIXTURE_DIR, "landmarks.npy"), landmarks)
+    print(f"Saved {len(frames)} frames and landmarks to {FIXTURE_DIR}")
+
+
+def summarize(latencies, items=1):
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000.0
+    return {
+        "samples": int(len(latencies)),
+        "fps": float(items * 1000.0 / latencies.mean()) if len(latencies) else 0.0,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def timed(func, inputs):
+    latencies = []
+    for item in inputs:
+        started = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_angles(landmarks):
+    # One (33, 4) frame at a time through the default rules, as the live path does.
+    rules = load_rules()
+    return summarize(timed(rules.angles, landmarks))
+
+
+def bench_angles_batch(landmarks, repeats=20):
+    # The whole (N, 33, 4) recording in one vectorized call.
+    rules = load_rules()
+    latencies = timed(rules.angles, [landmarks] * repeats)
+    return summarize(latencies, items=len(landmarks))
+
+
+def bench_analyze_posture(landmarks):
+    # Per-frame classification with the compiled default rules.
+    rules = load_rules()
+    return summarize(timed(rules.is_slouching, landmarks))
+
+
+def bench_state(landmarks, fps=30.0):
+    estimator = PostureStateEstimator()
+    frames = [(frame, i / fps) for i, frame in enumerate(landmarks)]
+    return summarize(timed(lambda item: estimator.update(*item), frames))
+
+
+def bench_inference(frames, backend, model_complexity, fps=30.0, target_fps=15.0):
+    # Mirrors the main loop of run_inference: the scheduler picks the frames
+    # to infer, the ROI tracker crops them for the pose graph and maps the
+    # landmarks back, then the state and the scheduler are updated. Latency
+    # covers the inferred frames; the ones the scheduler skips are counted.
+    from frame_scheduler import FrameScheduler
+    from pose_estimator import create_pose_estimator
+    from roi_tracker import ROITracker
+
+    rules = load_rules()
+    scheduler = FrameScheduler(rules=rules)
+    state_estimator = PostureStateEstimator(rules)
+    roi_tracker = ROITracker(target_fps, rules=rules)
+    latencies = []
+    skipped = 0
+    with create_pose_estimator(backend, model_complexity) as estimator:
+        estimator.estimate(frames[0])  # graph warm-up
+        for i, frame in enumerate(frames):
+            captured_at = i / fps
+            started = time.perf_counter()
+            if not scheduler.should_infer(frame, captured_at):
+                skipped += 1
+                continue
+            landmarks, _ = estimator.estimate(roi_tracker.prepare(frame))
+            if landmarks is not None:
+                landmarks = roi_tracker.to_frame(landmarks)
+            roi_tracker.update(landmarks, time.perf_counter() - started)
+            slouch = state_estimator.update(landmarks, captured_at)
+            scheduler.update(landmarks, slouch, captured_at)
+            latencies.append(time.perf_counter() - started)
+    results = summarize(latencies)
+    results["skipped_frames"] = skipped
+    return results
+
+
+def bench_startup(frames_path, backend, model_complexity, runs=3):
+    first_verdict = []
+    gui_import = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, frames_path, backend, str(model_complexity)],
+                                cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        first_verdict.append(timings["first_verdict"])
+        gui_import.append(timings["gui_import"])
+    result = summarize(first_verdict)
+    result["gui_import_ms"] = float(np.mean(gui_import) * 1000.0)
+    return result
+
+
+def bench_preview(frames):
+    # update_preview's work: resize, colour conversion and the PhotoImage update.
+    import tkinter as tk
+    from preview_renderer import PreviewRenderer
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return {"skipped": f"no display: {e}"}
+    root.withdraw()
+    canvas = tk.Canvas(root, width=320, height=240)
+    renderer = PreviewRenderer(canvas, 320, 240)
+    latencies = timed(lambda item: renderer.render(item[1], item[0]), list(enumerate(frames)))
+    root.destroy()
+    return summarize(latencies)
+
+
+def bench_db(records=2000):
+    # Percentiles are per batched insert_log plus commit on the writer
+    # thread, and fps is rows committed per second of commit time. Queueing
+    # a record from the GUI is reported separately as enqueue_*.
+    from frame_pipeline import StageStats
+    from posture_db import PostureLogWriter
+
+    commits = []
+    stats = StageStats(forward=lambda stage, seconds: commits.append(seconds) if stage == "db_commit" else None)
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = PostureLogWriter(os.path.join(tmp, "bench.db"), stats=stats)
+        enqueue = timed(lambda i: writer.log("bench", 1704067200.0 + i, "Good Posture", 1.0),
+                        range(records))
+        started = time.perf_counter()
+        writer.flush()
+        flush_time = time.perf_counter() - started
+        writer.close()
+    result = summarize(commits, items=records / len(commits))
+    enqueue = summarize(enqueue)
+    result["enqueue_p50_ms"] = enqueue["p50_ms"]
+    result["enqueue_p99_ms"] = enqueue["p99_ms"]
+    result["flush_ms"] = flush_time * 1000.0
+    return result
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark posture detection without a webcam.")
+    parser.add_argument("--landmarks", help="Recorded landmark fixture (.npy, shape (N, 33, 4))")
+    parser.add_argument("--frames", help="Recorded frame fixture (.npy) or video file")
+    parser.add_argument("--limit", type=int, default=300, help="Maximum number of frames to replay")
+    parser.add_argument("--record", metavar="VIDEO", help="Record frame and landmark fixtures from a video")
+    parser.add_argument("--backend", default="pose", choices=("pose", "holistic"))
+    parser.add_argument("--model-complexity", type=int, default=1, choices=(0, 1, 2))
+    parser.add_argument("--stages",
+                        default="angles,angles_batch,analyze_posture,state,inference,startup,preview,db",
+                        help="Comma-separated stages to run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.record:
+        record_fixtures(args.record, args.limit, args.backend, args.model_complexity)
+        return 0
+
+    default_landmarks = os.path.join(FIXTURE_DIR, "landmarks.npy")
+    default_frames = os.path.join(FIXTURE_DIR, "frames.npy")
+    landmarks_path = args.landmarks or (default_landmarks if os.path.exists(default_landmarks) else None)
+    frames_path = args.frames or (default_frames if os.path.exists(default_frames) else None)
+
+    landmarks = np.load(landmarks_path) if landmarks_path else make_landmark_fixture()
+    landmarks = np.ascontiguousarray(landmarks[:args.limit])
+    frames = load_frames(frames_path, args.limit) if frames_path else None
+
+    stages = {
+        "angles": lambda: bench_angles(landmarks),
+        "angles_batch": lambda: bench_angles_batch(landmarks),
+        "analyze_posture": lambda: bench_analyze_posture(landmarks),
+        "state": lambda: bench_state(landmarks),
+        "inference": lambda: bench_inference(frames, args.backend, args.model_complexity),
+        "startup": lambda: bench_startup(frames_path, args.backend, args.model_complexity),
+        "preview": lambda: bench_preview(frames),
+        "db": bench_db,
+    }
+    results = {}
+    for name in args.stages.split(","):
+        name = name.strip()
+        if name not in stages:
+            print(f"Unknown stage '{name}'")
+            return 1
+        if name in ("inference", "startup", "preview") and frames is None:
+            results[name] = {"skipped": "no frame fixture (use --frames or --record)"}
+            continue
+        try:
+            results[name] = stages[name]()
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e}"}
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "landmark_fixture": landmarks_path or "synthetic",
+        "frame_fixture": frames_path,
+        "frames": int(len(landmarks)),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": results,
+    }
+
+    for name, stats in results.items():
+        if "skipped" in stats:
+            print(f"{name:16s} skipped ({stats['skipped']})")
+        else:
+            print(f"{name:16s} {stats['fps']:10.1f} fps  p50 {stats['p50_ms']:.3f}ms  "
+                  f"p95 {stats['p95_ms']:.3f}ms  p99 {stats['p99_ms']:.3f}ms")
+            if "skipped_frames" in stats:
+                print(f"{'':16s} {stats['skipped_frames']} frames skipped by the scheduler")
+            if "enqueue_p50_ms" in stats:
+                print(f"{'':16s} enqueue p50 {stats['enqueue_p50_ms']:.4f}ms  p99 {stats['enqueue_p99_ms']:.4f}ms")
+    print(f"Peak RSS: {report['peak_rss_mb']:.1f} MB" if report["peak_rss_mb"] else "Peak RSS: n/a")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
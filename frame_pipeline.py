@@ -0,0 +1,183 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class FrameRing:
+    # A fixed pool of preallocated frame buffers. The writer always copies into
+    # a free slot and publishes it as the newest frame, so a slow reader only
+    # ever sees the latest frame and older ones are silently overwritten.
+    # Readers check a slot out while they use it so it is not overwritten.
+
+    def __init__(self, shape, dtype=np.uint8, slots=4):
+        if slots < 3:
+            raise ValueError("FrameRing needs at least 3 slots")
+        self.buffers = [np.empty(shape, dtype=dtype) for _ in range(slots)]
+        self.captured_at = [0.0] * slots
+        self.in_use = [0] * slots
+        self.seq = -1
+        self.latest_slot = None
+        self.dropped = 0
+        self._consumed_seq = -1
+        self._next_slot = 0
+        self._cond = threading.Condition()
+
+    def _free_slot(self):
+        slots = len(self.buffers)
+        for i in range(slots):
+            slot = (self._next_slot + i) % slots
+            if slot != self.latest_slot and not self.in_use[slot]:
+                self._next_slot = (slot + 1) % slots
+                return slot
+        return None
+
+    def write(self, frame, captured_at):
+        with self._cond:
+            slot = self._free_slot()
+            if slot is None:
+                self.dropped += 1
+                return None
+        if frame.shape != self.buffers[slot].shape:
+            self.buffers[slot] = np.empty_like(frame)
+        np.copyto(self.buffers[slot], frame)
+        with self._cond:
+            if self.seq > self._consumed_seq:
+                self.dropped += 1
+            self.seq += 1
+            self.latest_slot = slot
+            self.captured_at[slot] = captured_at
+            self._cond.notify_all()
+            return self.seq
+
+    def checkout_latest(self, after_seq=-1, timeout=None):
+        # Returns (seq, slot, frame, captured_at) for the newest frame newer
+        # than after_seq, or None on timeout. Call release(slot) when done.
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > after_seq, timeout):
+                return None
+            slot = self.latest_slot
+            self.in_use[slot] += 1
+            self._consumed_seq = self.seq
+            return self.seq, slot, self.buffers[slot], self.captured_at[slot]
+
+    def release(self, slot):
+        with self._cond:
+            self.in_use[slot] -= 1
+
+
+class LatestQueue(queue.Queue):
+    # Bounded queue that drops the oldest item instead of blocking the producer.
+
+    def __init__(self, maxsize=1, on_drop=None):
+        super().__init__(maxsize)
+        self.on_drop = on_drop
+        self.dropped = 0
+
+    def put_latest(self, item):
+        while True:
+            try:
+                self.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    old = self.get_nowait()
+                except queue.Empty:
+                    continue
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop(old)
+
+
+class StageStats:
+    # Rolling per-stage latency in milliseconds over the last `window` samples.
+    # Samples are also passed to forward(stage, seconds) when one is set.
+
+    def __init__(self, window=120, forward=None):
+        self.window = window
+        self.forward = forward
+        self.samples = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+                self.counts[stage] = 0
+            self.samples[stage].append(seconds * 1000.0)
+            self.counts[stage] += 1
+        if self.forward is not None:
+            self.forward(stage, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: {"count": self.counts[stage],
+                            "mean_ms": float(np.mean(values)),
+                            "p95_ms": float(np.percentile(values, 95))}
+                    for stage, values in self.samples.items() if values}
+
+    def summary(self):
+        return " | ".join(f"{stage} {stats['mean_ms']:.1f}ms (p95 {stats['p95_ms']:.1f})"
+                          for stage, stats in self.snapshot().items())
+
+
+class CaptureThread(threading.Thread):
+    # Reads frames as fast as the device delivers them and keeps only the
+    # newest one in a FrameRing, so the camera buffer never fills with stale
+    # frames while inference is busy. Video files can be paced to their frame
+    # rate with frame_interval and stop at end of file with stop_at_eof.
+    # Setting decode_interval keeps draining the device with grab() but only
+    # decodes a frame that often.
+
+    def __init__(self, cap, ring, stats=None, frame_interval=0.0, stop_at_eof=False):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.ring = ring
+        self.stats = stats
+        self.frame_interval = frame_interval
+        self.stop_at_eof = stop_at_eof
+        self.decode_interval = 0.0
+        self.running = True
+        self.failed_reads = 0
+
+    def run(self):
+        next_frame = time.perf_counter()
+        last_decode = 0.0
+        while self.running:
+            if self.frame_interval:
+                delay = next_frame - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_frame = max(next_frame + self.frame_interval, time.perf_counter() - self.frame_interval)
+
+            started = time.perf_counter()
+            if self.decode_interval and started - last_decode < self.decode_interval:
+                if not self.cap.grab():
+                    self._read_failed()
+                continue
+
+            ret, frame = self.cap.read()
+            if not ret:
+                self._read_failed()
+                continue
+            captured_at = last_decode = time.perf_counter()
+            if self.stats is not None:
+                self.stats.record("capture", captured_at - started)
+            self.ring.write(frame, captured_at)
+
+    def _read_failed(self):
+        # End of a video file, or a camera that stopped delivering frames:
+        # back off so an unplugged device is not polled in a tight loop.
+        if self.stop_at_eof:
+            self.running = False
+            return
+        self.failed_reads += 1
+        print("Warning: Could not read frame from webcam.")
+        time.sleep(0.1)
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        self.join(timeout)
@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+
+from posture_rules import load_rules
+
+ACTIVE = "active"
+STABLE = "stable"
+IDLE = "idle"
+
+
+class FrameScheduler:
+    # Decides how often to decode and run inference. ACTIVE runs every frame;
+    # STABLE (same verdict, landmarks still) and IDLE (nobody in view) run at
+    # reduced rates. Stillness is judged on the joints the posture rules
+    # measure this frame. A cheap frame difference on a tiny grayscale
+    # thumbnail switches back to ACTIVE the moment anything moves.
+
+    # mode: (seconds between decoded frames, seconds between inferences, GUI poll ms)
+    RATES = {
+        ACTIVE: (0.0, 0.0, 500),
+        STABLE: (0.1, 0.5, 1000),
+        IDLE: (0.25, 2.0, 2000),
+    }
+
+    def __init__(self, stable_after=5.0, idle_after=10.0, motion_threshold=6.0,
+                 landmark_tolerance=0.02, thumbnail_size=(32, 24), rules=None):
+        self.rules = rules if rules is not None else load_rules()
+        self.stable_after = stable_after
+        self.idle_after = idle_after
+        self.motion_threshold = motion_threshold
+        self.landmark_tolerance = landmark_tolerance
+        self.thumbnail_size = thumbnail_size
+        self.mode = ACTIVE
+        self.thumbnail = None
+        self.last_inference = 0.0
+        self.last_landmarks = None
+        self.last_state = None
+        self.steady_since = None
+        self.last_pose_seen = None
+
+    @property
+    def capture_interval(self):
+        return self.RATES[self.mode][0]
+
+    @property
+    def inference_interval(self):
+        return self.RATES[self.mode][1]
+
+    @property
+    def poll_interval_ms(self):
+        return self.RATES[self.mode][2]
+
+    def motion(self, frame):
+        # Mean absolute difference between this and the previous thumbnail.
+        small = cv2.resize(frame, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        thumbnail = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        previous, self.thumbnail = self.thumbnail, thumbnail
+        if previous is None:
+            return 0.0
+        return float(cv2.absdiff(thumbnail, previous).mean())
+
+    def should_infer(self, frame, now):
+        if self.mode != ACTIVE and self.motion(frame) >= self.motion_threshold:
+            self.mode = ACTIVE
+            self.steady_since = None
+            return True
+        return now - self.last_inference >= self.inference_interval
+
+    def update(self, landmarks, state, now):
+        # Called after every inference with its landmarks and posture state,
+        # using the same clock as should_infer.
+        self.last_inference = now
+        if self.last_pose_seen is None:
+            self.last_pose_seen = now
+        if landmarks is None:
+            self.last_landmarks = None
+            self.steady_since = None
+            if now - self.last_pose_seen >= self.idle_after:
+                self.mode = IDLE
+            return
+
+        self.last_pose_seen = now
+        measured = self.rules.measured_landmarks(landmarks)
+        still = (self.last_landmarks is not None and state == self.last_state and
+                 np.abs(landmarks[measured, :2] - self.last_landmarks[measured]).max() <= self.landmark_tolerance)
+        self.last_landmarks = landmarks[:, :2].copy()
+        self.last_state = state
+
+        if not still:
+            self.steady_since = None
+            self.mode = ACTIVE
+        elif self.steady_since is None:
+            self.steady_since = now
+        elif now - self.steady_since >= self.stable_after:
+            self.mode = STABLE
+        if self.mode == ACTIVE:
+            # Keep the thumbnail fresh so the first check after slowing down
+            # compares against a recent frame.
+            self.thumbnail = None
@@ -0,0 +1,372 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+LANDMARK_FIELDS = 4  # x, y, z, visibility
+DEFAULT_POLL_INTERVAL_MS = 500
+
+# Latest pose published by the inference process: a (33, 4) float32 array of
+# x, y, z, visibility (or None when no person is found), the capture time
+# and the smoothed, debounced slouch state as of that frame.
+PoseResult = namedtuple("PoseResult", ["landmarks", "timestamp", "slouch"])
+
+
+def _aligned(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class SharedInferenceBuffer:
+    # The newest annotated frame and pose result, in one shared memory block
+    # that both processes map. Frames are triple-buffered: the writer never
+    # touches the slot it last published or the slot the reader has mapped,
+    # so neither side waits for the other and frames are never pickled.
+    # The lock only guards the small header and result copies.
+
+    def __init__(self, shape, slots=3, lock=None, name=None):
+        if slots < 3:
+            raise ValueError("SharedInferenceBuffer needs at least 3 slots")
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        self.owner = name is None
+
+        landmarks_offset = 128
+        frames_offset = _aligned(landmarks_offset + NUM_LANDMARKS * LANDMARK_FIELDS * 4)
+        size = frames_offset + slots * int(np.prod(self.shape))
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        buf = self.shm.buf
+        # frame seq, latest frame slot, slot mapped by the reader, result seq
+        self.header = np.ndarray((4,), dtype=np.int64, buffer=buf, offset=0)
+        # capture timestamp, slouch, pose found, GUI poll interval in ms
+        self.result = np.ndarray((4,), dtype=np.float64, buffer=buf, offset=64)
+        self.landmarks = np.ndarray((NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32, buffer=buf,
+                                    offset=landmarks_offset)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=frames_offset)
+        if self.owner:
+            self.header[:] = -1
+            self.result[:] = 0.0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        # Arguments that attach another process to this buffer.
+        return self.shape, self.slots, self.lock, self.name
+
+    def begin_frame(self):
+        # Returns (slot, buffer) for the single writer to fill, then publish_frame(slot).
+        with self.lock:
+            busy = (self.header[1], self.header[2])
+        slot = next(s for s in range(self.slots) if s not in busy)
+        return slot, self.frames[slot]
+
+    def publish_frame(self, slot):
+        with self.lock:
+            self.header[0] += 1
+            self.header[1] = slot
+
+    def latest_frame(self, after_seq=-1):
+        # Maps the newest frame newer than after_seq as (seq, frame), or None.
+        # The frame stays untouched until the next call.
+        with self.lock:
+            seq, slot = int(self.header[0]), int(self.header[1])
+            if seq <= after_seq or slot < 0:
+                return None
+            self.header[2] = slot
+        return seq, self.frames[slot]
+
+    def publish_result(self, pose_result, poll_interval_ms):
+        with self.lock:
+            if pose_result.landmarks is None:
+                self.landmarks[:] = np.nan
+            else:
+                self.landmarks[:] = pose_result.landmarks
+            self.result[:] = (pose_result.timestamp, pose_result.slouch,
+                              pose_result.landmarks is not None, poll_interval_ms)
+            self.header[3] += 1
+
+    def latest_result(self):
+        # Returns the newest PoseResult, or None before the first inference.
+        with self.lock:
+            if self.header[3] < 0:
+                return None
+            timestamp, slouch, found, _ = self.result.tolist()
+            landmarks = self.landmarks.copy() if found else None
+        return PoseResult(landmarks, timestamp, bool(slouch))
+
+    def poll_interval_ms(self):
+        with self.lock:
+            return int(self.result[3]) or DEFAULT_POLL_INTERVAL_MS
+
+    def close(self):
+        # Views into the block must be dropped before it can be closed.
+        self.header = self.result = self.landmarks = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def run_inference(spec, control, events, **options):
+    # Entry point of the inference process. Capture runs on its own thread and
+    # keeps only the newest frame in a ring of preallocated buffers; annotation
+    # runs on a third thread, only while the GUI asks for preview frames, and
+    # draws straight into the shared buffer. Stage timings and counters go
+    # back to the GUI on the events queue, followed by a "ready" event once
+    # the pose graph is warm and frames are flowing. Any failure, including
+    # during startup, is reported as an "error" event before the child exits.
+    try:
+        _run_inference(spec, control, events, **options)
+    except Exception as e:
+        events.put(("error", f"Inference process failed: {e}"))
+        raise
+
+
+def _run_inference(spec, control, events, backend="pose", model_complexity=1, roi_tracking=True,
+                   target_fps=15.0, rules_path=None, record_dir=None, report_interval=10.0,
+                   stats_interval=1.0, camera=0):
+    import cv2
+
+    shared = SharedInferenceBuffer(*spec)
+    height, width = shared.shape[:2]
+
+    # Opening the webcam can take a second; do it while mediapipe loads.
+    opened = []
+
+    def open_camera():
+        cap = cv2.VideoCapture(camera)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        opened.append(cap)
+
+    opener = threading.Thread(target=open_camera, daemon=True)
+    opener.start()
+
+    from frame_pipeline import CaptureThread, FrameRing, LatestQueue, StageStats
+    from frame_scheduler import FrameScheduler
+    from landmark_recorder import LandmarkRecorder
+    from overlay_renderer import OverlayRenderer
+    from pose_estimator import POSE_CONNECTIONS, create_pose_estimator
+    from posture_rules import load_rules
+    from posture_state import PostureStateEstimator
+    from roi_tracker import ROITracker
+
+    estimator = create_pose_estimator(backend, model_complexity)
+    # The first inference allocates the model's tensors; pay for it up front.
+    estimator.estimate(np.zeros(shared.shape, dtype=np.uint8))
+    running = threading.Event()
+    running.set()
+    annotate = threading.Event()
+
+    def read_control():
+        while running.is_set():
+            command, value = control.get()
+            if command == "stop":
+                # The GUI stops draining events once it asks us to stop, so
+                # queued stats must not hold up the exit.
+                events.cancel_join_thread()
+                running.clear()
+            elif command == "annotate":
+                if value:
+                    annotate.set()
+                else:
+                    annotate.clear()
+
+    opener.join()
+    cap = opened[0]
+    if not cap.isOpened():
+        events.put(("error", "Could not open webcam."))
+        estimator.close()
+        shared.close()
+        return
+
+    pending = deque()
+    stats = StageStats(forward=lambda stage, seconds: pending.append((stage, seconds)))
+    ring = FrameRing(shared.shape)
+    annotate_queue = LatestQueue(maxsize=1, on_drop=lambda item: ring.release(item[1]))
+    capture_thread = CaptureThread(cap, ring, stats)
+    renderer = OverlayRenderer(POSE_CONNECTIONS, landmark_color=(0, 255, 0), connection_color=(0, 0, 255))
+    frames_without_pose = 0
+
+    def annotation_loop():
+        while running.is_set():
+            try:
+                seq, slot, frame, captured_at, landmarks = annotate_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            started = time.perf_counter()
+            target, annotated = shared.begin_frame()
+            if frame.shape == annotated.shape:
+                np.copyto(annotated, frame)
+            else:
+                cv2.resize(frame, (width, height), dst=annotated, interpolation=cv2.INTER_AREA)
+            ring.release(slot)
+            renderer.skeleton(annotated, landmarks)
+            shared.publish_frame(target)
+            stats.record("annotation", time.perf_counter() - started)
+
+    control_thread = threading.Thread(target=read_control, daemon=True)
+    annotation_thread = threading.Thread(target=annotation_loop, daemon=True)
+    control_thread.start()
+    capture_thread.start()
+    annotation_thread.start()
+
+    rules = load_rules(rules_path)
+    scheduler = FrameScheduler(rules=rules)
+    state_estimator = PostureStateEstimator(rules)
+    roi_tracker = ROITracker(target_fps, rules=rules) if roi_tracking else None
+    recorder = None
+    if record_dir:
+        recorder = LandmarkRecorder(os.path.join(record_dir, time.strftime("%Y%m%d-%H%M%S")))
+
+    seq = -1
+    last_report = last_stats = time.perf_counter()
+    events.put(("ready", time.time()))
+    try:
+        with estimator:
+            while running.is_set():
+                item = ring.checkout_latest(seq, timeout=0.5)
+                if item is None:
+                    continue
+                seq, slot, frame, captured_at = item
+                if not scheduler.should_infer(frame, captured_at):
+                    ring.release(slot)
+                    capture_thread.decode_interval = scheduler.capture_interval
+                    continue
+
+                handed_off = False
+                try:
+                    started = time.perf_counter()
+                    stats.record("queue", started - captured_at)
+
+                    if roi_tracker is not None:
+                        landmarks, _ = estimator.estimate(roi_tracker.prepare(frame))
+                        if landmarks is not None:
+                            landmarks = roi_tracker.to_frame(landmarks)
+                        roi_tracker.update(landmarks, time.perf_counter() - started)
+                    else:
+                        landmarks, _ = estimator.estimate(frame)
+                    inferred = time.perf_counter()
+                    stats.record("inference", inferred - started)
+                    if landmarks is None:
+                        frames_without_pose += 1
+
+                    slouch = state_estimator.update(landmarks, captured_at)
+                    finished = time.perf_counter()
+                    stats.record("classification", finished - inferred)
+                    scheduler.update(landmarks, slouch, captured_at)
+                    capture_thread.decode_interval = scheduler.capture_interval
+
+                    pose_result = PoseResult(landmarks, time.time() - (finished - captured_at), slouch)
+                    if recorder is not None:
+                        recorder.append(landmarks, pose_result.timestamp)
+                    shared.publish_result(pose_result, scheduler.poll_interval_ms)
+                    stats.record("end_to_end", time.perf_counter() - captured_at)
+
+                    if annotate.is_set():
+                        annotate_queue.put_latest((seq, slot, frame, captured_at, landmarks))
+                        handed_off = True
+                finally:
+                    if not handed_off:
+                        ring.release(slot)
+
+                if finished - last_stats >= stats_interval:
+                    samples = [pending.popleft() for _ in range(len(pending))]
+                    events.put(("stats", samples, {"dropped_frames": ring.dropped,
+                                                   "failed_reads": capture_thread.failed_reads,
+                                                   "frames_without_pose": frames_without_pose}))
+                    last_stats = finished
+                if finished - last_report >= report_interval:
+                    print(f"Pipeline: {stats.summary()} | dropped {ring.dropped} frames")
+                    last_report = finished
+    finally:
+        running.clear()
+        capture_thread.stop()
+        annotation_thread.join(timeout=1.0)
+        if recorder is not None:
+            recorder.close()
+        cap.release()
+        shared.close()
+        print("Camera released")
+
+
+class InferenceProcess:
+    # Runs capture, inference and annotation in a child process so the Python
+    # work of the camera loop never competes with the Tk mainloop for the GIL.
+    # The GUI maps the latest frame and result from shared memory and talks to
+    # the child through a small control queue; the child reports errors and
+    # stage timings on an events queue that poll_events() drains. Starting it
+    # early lets the model warm up while the rest of the app starts.
+
+    def __init__(self, shape, stats=None, **options):
+        # spawn rather than fork: the parent already holds Tk and camera state.
+        context = multiprocessing.get_context("spawn")
+        self.buffer = SharedInferenceBuffer(shape, lock=context.Lock())
+        self.control = context.Queue()
+        self.events = context.Queue()
+        self.stats = stats
+        self.counters = {}
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+        self.process = context.Process(target=run_inference, name="posture-inference", daemon=True,
+                                       args=(self.buffer.spec(), self.control, self.events),
+                                       kwargs=options)
+
+    def start(self):
+        self.started_at = time.time()
+        self.process.start()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def set_annotation(self, enabled):
+        # Annotated frames are only drawn while something displays them.
+        self.control.put(("annotate", bool(enabled)))
+
+    def poll_events(self):
+        # Non-blocking; call from the GUI loop.
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return
+            if event[0] == "stats":
+                if self.stats is not None:
+                    for stage, seconds in event[1]:
+                        self.stats.record(stage, seconds)
+                self.counters.update(event[2])
+            elif event[0] == "ready":
+                self.ready_at = event[1]
+                print(f"Pose model ready in {self.ready_at - self.started_at:.2f}s")
+            elif event[0] == "error":
+                self.error = event[1]
+                print(f"Error: {event[1]}")
+
+    def latest_result(self):
+        return self.buffer.latest_result()
+
+    def latest_frame(self, after_seq=-1):
+        return self.buffer.latest_frame(after_seq)
+
+    def poll_interval_ms(self):
+        return self.buffer.poll_interval_ms()
+
+    def stop(self, timeout=2.0):
+        if self.process.is_alive():
+            self.control.put(("stop", None))
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout)
+        self.control.close()
+        self.events.close()
+        self.buffer.close()
@@ -0,0 +1,155 @@
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from posture_rules import load_rules
+
+NUM_LANDMARKS = 33
+LANDMARK_FIELDS = 4  # x, y, z, visibility
+CHUNK_FRAMES = 30 * 60 * 30  # 30 minutes at 30 fps
+
+
+class LandmarkRecorder:
+    # Appends every frame's landmarks and timestamp to preallocated,
+    # memory-mapped .npy chunks inside a session directory. Frames without a
+    # detected pose are stored as NaN so the timeline has no gaps. Unused
+    # rows keep a NaN timestamp, so a session that was never closed can
+    # still be read back.
+
+    def __init__(self, path, chunk_frames=CHUNK_FRAMES):
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.counts = []
+        self.landmarks = None
+        self.timestamps = None
+        self.row = 0
+        os.makedirs(path, exist_ok=True)
+        self._open_chunk()
+
+    def _chunk_paths(self, index):
+        base = os.path.join(self.path, f"chunk_{index:05d}")
+        return base + ".landmarks.npy", base + ".timestamps.npy"
+
+    def _open_chunk(self):
+        landmarks_path, timestamps_path = self._chunk_paths(len(self.counts))
+        self.landmarks = open_memmap(landmarks_path, mode="w+", dtype=np.float32,
+                                     shape=(self.chunk_frames, NUM_LANDMARKS, LANDMARK_FIELDS))
+        self.timestamps = open_memmap(timestamps_path, mode="w+", dtype=np.float64,
+                                      shape=(self.chunk_frames,))
+        self.timestamps[:] = np.nan
+        self.counts.append(0)
+        self.row = 0
+
+    def append(self, landmarks, timestamp):
+        if self.row == self.chunk_frames:
+            self._close_chunk()
+            self._open_chunk()
+        if landmarks is None:
+            self.landmarks[self.row] = np.nan
+        else:
+            self.landmarks[self.row] = landmarks
+        self.timestamps[self.row] = timestamp
+        self.row += 1
+        self.counts[-1] = self.row
+
+    def _close_chunk(self):
+        self.landmarks.flush()
+        self.timestamps.flush()
+        self._write_index()
+
+    def _write_index(self):
+        with open(os.path.join(self.path, "index.json"), "w") as f:
+            json.dump({"chunk_frames": self.chunk_frames, "counts": self.counts}, f)
+
+    def close(self):
+        if self.landmarks is not None:
+            self._close_chunk()
+            self.landmarks = None
+            self.timestamps = None
+
+
+class LandmarkReader:
+    # Streams a recorded session back as read-only memory-mapped slices, one
+    # chunk at a time, without copying.
+
+    def __init__(self, path):
+        self.path = path
+        landmark_files = sorted(glob.glob(os.path.join(path, "chunk_*.landmarks.npy")))
+        if not landmark_files:
+            raise FileNotFoundError(f"No landmark chunks in {path}")
+        self.files = [(f, f.replace(".landmarks.npy", ".timestamps.npy")) for f in landmark_files]
+        self.counts = None
+        index_path = os.path.join(path, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                counts = json.load(f)["counts"]
+            if len(counts) == len(self.files):
+                self.counts = counts
+
+    def _count(self, index, timestamps):
+        if self.counts is not None:
+            return self.counts[index]
+        # Unclosed session: the first NaN timestamp marks the end of the data.
+        unused = np.flatnonzero(np.isnan(timestamps))
+        return int(unused[0]) if len(unused) else len(timestamps)
+
+    def chunks(self):
+        for index, (landmarks_path, timestamps_path) in enumerate(self.files):
+            timestamps = np.load(timestamps_path, mmap_mode="r")
+            count = self._count(index, timestamps)
+            if count:
+                yield np.load(landmarks_path, mmap_mode="r")[:count], timestamps[:count]
+
+    def __len__(self):
+        return sum(len(timestamps) for _, timestamps in self.chunks())
+
+
+def reclassify(path, rules=None):
+    # Re-scores a recorded session with a (possibly different) rule set, chunk by chunk.
+    rules = rules or load_rules()
+    frames = detected = slouched = 0
+    slouch_time = good_time = 0.0
+    for landmarks, timestamps in LandmarkReader(path).chunks():
+        slouch = rules.is_slouching(landmarks)
+        present = np.isfinite(landmarks[:, :, :2]).all(axis=(1, 2))
+        durations = np.diff(timestamps, append=timestamps[-1])
+        frames += len(timestamps)
+        detected += int(present.sum())
+        slouched += int(slouch.sum())
+        slouch_time += float(durations[slouch].sum())
+        good_time += float(durations[present & ~slouch].sum())
+    return {
+        "frames": frames,
+        "frames_with_pose": detected,
+        "frames_slouching": slouched,
+        "slouch_time": slouch_time,
+        "good_time": good_time,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-classify recorded landmark sessions.")
+    parser.add_argument("sessions", nargs="+", help="Session directories written by LandmarkRecorder")
+    parser.add_argument("--rules", help="Posture rules file (default: posture_rules.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rules = load_rules(args.rules)
+    for session in args.sessions:
+        result = reclassify(session, rules)
+        total = result["good_time"] + result["slouch_time"]
+        ratio = result["good_time"] / total * 100 if total > 0 else 0
+        print(f"{session}: {result['frames']} frames ({result['frames_with_pose']} with pose), "
+              f"good {result['good_time']:.1f}s, slouch {result['slouch_time']:.1f}s, ratio {ratio:.1f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
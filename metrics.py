@@ -0,0 +1,140 @@
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency histogram bucket upper bounds in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class TimedLock:
+    # Wraps a threading or multiprocessing lock and records how long callers
+    # wait for it.
+
+    def __init__(self, metrics, name, lock=None):
+        self._lock = lock if lock is not None else threading.Lock()
+        self._metrics = metrics
+        self._name = name
+
+    def acquire(self, *args, **kwargs):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(*args, **kwargs)
+        self._metrics.observe(self._name + "_wait", time.perf_counter() - started)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class Metrics:
+    # Process-wide latency histograms and polled gauges. Every recording call
+    # returns immediately when disabled, and lock() hands back the plain lock,
+    # so a disabled registry costs next to nothing.
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.gauges = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def gauge(self, name, func):
+        # func is polled whenever metrics are rendered.
+        if self.enabled:
+            self.gauges[name] = func
+
+    def lock(self, name, lock=None):
+        # Times waits on lock (a new threading.Lock by default) as name_wait.
+        if not self.enabled:
+            return lock if lock is not None else threading.Lock()
+        return TimedLock(self, name, lock)
+
+    def render_prometheus(self):
+        lines = [f"posture_uptime_seconds {time.time() - self.started:.3f}"]
+        with self._lock:
+            histograms = {name: (list(h.counts), h.total, h.count) for name, h in self.histograms.items()}
+        for name, func in sorted(self.gauges.items()):
+            lines.append(f"# TYPE posture_{name} gauge")
+            lines.append(f"posture_{name} {func()}")
+        for name, (counts, total, count) in sorted(histograms.items()):
+            lines.append(f"# TYPE posture_{name}_seconds histogram")
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f'posture_{name}_seconds_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'posture_{name}_seconds_bucket{{le="+Inf"}} {count}')
+            lines.append(f"posture_{name}_seconds_sum {total:.6f}")
+            lines.append(f"posture_{name}_seconds_count {count}")
+        return "\n".join(lines) + "\n"
+
+    def log_line(self):
+        with self._lock:
+            parts = [f"{name} {h.count}x{h.total / h.count * 1000:.1f}ms"
+                     for name, h in sorted(self.histograms.items()) if h.count]
+        parts += [f"{name}={func()}" for name, func in sorted(self.gauges.items())]
+        return "Metrics: " + " | ".join(parts)
+
+    def serve(self, port, host="127.0.0.1"):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://{host}:{port}/metrics")
+        return server
+
+    def start_logging(self, interval):
+        def log_loop():
+            while True:
+                time.sleep(interval)
+                print(self.log_line())
+
+        threading.Thread(target=log_loop, daemon=True).start()
+
+
+# Enabled by setting POSTURE_METRICS=1 (or a metrics port) in the environment.
+metrics = Metrics(enabled=os.environ.get("POSTURE_METRICS", "") not in ("", "0")
+                  or bool(os.environ.get("POSTURE_METRICS_PORT")))
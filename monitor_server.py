@@ -0,0 +1,253 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+import cv2
+
+from frame_pipeline import CaptureThread, FrameRing, StageStats
+from landmark_recorder import LandmarkRecorder
+from pose_estimator import create_pose_estimator
+from posture_db import GOOD_POSTURE, SLOUCH_DETECTED, PostureLogWriter
+from posture_rules import load_rules
+from posture_state import PostureStateEstimator
+from roi_tracker import ROITracker
+
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+STATUS_INTERVAL = 30.0  # seconds
+
+
+class CameraSession:
+    # One monitored workstation: a capture source, its own frame ring, pose
+    # graph and posture state, and one user's posture_log rows.
+
+    def __init__(self, username, source, db_writer, stats, rules, backend="pose", model_complexity=1,
+                 record_dir=None):
+        self.username = username
+        self.source = source
+        self.db_writer = db_writer
+        self.stats = stats
+        self.backend = backend
+        self.model_complexity = model_complexity
+        self.cap = None
+        self.ring = None
+        self.capture_thread = None
+        self.estimator = None
+        self.state = PostureStateEstimator(rules)
+        self.roi_tracker = ROITracker(rules=rules)
+        self.recorder = None
+        if record_dir:
+            self.recorder = LandmarkRecorder(
+                os.path.join(record_dir, f"{username}-{time.strftime('%Y%m%d-%H%M%S')}"))
+        self.processed_seq = -1
+        self.busy = False
+        self.frames = 0
+        self.last_status = None
+        self.last_status_change_time = None
+
+    @property
+    def is_file(self):
+        return not isinstance(self.source, int)
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            print(f"Error: Could not open source {self.source} for {self.username}.")
+            return False
+
+        frame_interval = 0.0
+        if self.is_file:
+            fps = self.cap.get(cv2.CAP_PROP_FPS)
+            frame_interval = 1.0 / fps if fps > 0 else 1.0 / 30
+        else:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+
+        self.ring = FrameRing((FRAME_HEIGHT, FRAME_WIDTH, 3))
+        self.capture_thread = CaptureThread(self.cap, self.ring, self.stats,
+                                            frame_interval=frame_interval, stop_at_eof=self.is_file)
+        self.capture_thread.start()
+        return True
+
+    @property
+    def finished(self):
+        return (self.capture_thread is None or not self.capture_thread.is_alive()) and \
+            self.ring is not None and self.ring.seq <= self.processed_seq
+
+    def process(self, frame, captured_at):
+        # Called by whichever inference worker claimed this session.
+        if self.estimator is None:
+            self.estimator = create_pose_estimator(self.backend, self.model_complexity)
+        started = time.perf_counter()
+        landmarks, _ = self.estimator.estimate(self.roi_tracker.prepare(frame))
+        if landmarks is not None:
+            landmarks = self.roi_tracker.to_frame(landmarks)
+        self.roi_tracker.update(landmarks, time.perf_counter() - started)
+        slouching = self.state.update(landmarks, captured_at)
+        now = time.time()
+        if self.recorder is not None:
+            self.recorder.append(landmarks, now)
+        self.frames += 1
+        self.record(SLOUCH_DETECTED if slouching else GOOD_POSTURE, now)
+
+    def record(self, status, now):
+        if status == self.last_status:
+            return
+        if self.last_status is not None:
+            self.log_segment(now)
+        else:
+            print(f"{self.username}: {status}")
+        self.last_status = status
+        self.last_status_change_time = now
+
+    def log_segment(self, now):
+        duration = now - self.last_status_change_time
+        self.db_writer.log(self.username, now, self.last_status, duration)
+
+    def close(self):
+        if self.capture_thread is not None:
+            self.capture_thread.stop()
+        if self.last_status is not None:
+            self.log_segment(time.time())
+            self.last_status = None
+        if self.estimator is not None:
+            self.estimator.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.cap is not None:
+            self.cap.release()
+
+
+class InferencePool:
+    # Worker threads shared by all sessions. Each round a worker claims every
+    # session with an unprocessed frame (up to sessions_per_round) and runs
+    # them back to back; MediaPipe releases the GIL inside the graph, so
+    # workers overlap. Frames are not batched into one model call: MediaPipe
+    # solutions take a single image, and each session keeps its own graph
+    # because landmark tracking state belongs to one stream. The pool shares
+    # threads, not graphs, so N cameras keep N graphs resident.
+
+    def __init__(self, sessions, stats, workers=2, sessions_per_round=4):
+        self.sessions = sessions
+        self.stats = stats
+        self.sessions_per_round = sessions_per_round
+        self.running = True
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _claim_round(self):
+        claimed = []
+        with self._lock:
+            for session in self.sessions:
+                if session.ring is None or session.busy or session.ring.seq <= session.processed_seq:
+                    continue
+                session.busy = True
+                claimed.append(session)
+                if len(claimed) >= self.sessions_per_round:
+                    break
+        return claimed
+
+    def _worker(self):
+        while self.running:
+            claimed = self._claim_round()
+            if not claimed:
+                time.sleep(0.005)
+                continue
+
+            started = time.perf_counter()
+            for session in claimed:
+                try:
+                    item = session.ring.checkout_latest(session.processed_seq, timeout=0)
+                    if item is None:
+                        continue
+                    seq, slot, frame, captured_at = item
+                    try:
+                        session.process(frame, captured_at)
+                    finally:
+                        session.ring.release(slot)
+                    session.processed_seq = seq
+                    self.stats.record("end_to_end", time.perf_counter() - captured_at)
+                except Exception as e:
+                    print(f"Inference error for {session.username}: {e}")
+                finally:
+                    session.busy = False
+            self.stats.record("round", time.perf_counter() - started)
+
+
+def parse_source(spec):
+    # "username=source", where source is a device index or a video path.
+    if "=" not in spec:
+        raise argparse.ArgumentTypeError(f"Expected USERNAME=SOURCE, got '{spec}'")
+    username, source = spec.split("=", 1)
+    if not username:
+        raise argparse.ArgumentTypeError(f"Missing username in '{spec}'")
+    return username, int(source) if source.isdigit() else source
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor several cameras without the GUI.")
+    parser.add_argument("--source", dest="sources", action="append", type=parse_source, required=True,
+                        metavar="USERNAME=SOURCE", help="Camera index or video file for one user (repeatable)")
+    parser.add_argument("--db", default="posture_data.db", help="SQLite database to write to")
+    parser.add_argument("--workers", type=int, default=2, help="Number of shared inference workers")
+    parser.add_argument("--sessions-per-round", type=int, default=4,
+                        help="Sessions a worker processes back to back before claiming more")
+    parser.add_argument("--backend", default="pose", choices=("pose", "holistic"))
+    parser.add_argument("--model-complexity", type=int, default=1, choices=(0, 1, 2))
+    parser.add_argument("--record-dir", help="Record every frame's landmarks under this directory")
+    parser.add_argument("--rules", help="Posture rules file (default: posture_rules.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stats = StageStats()
+    rules = load_rules(args.rules)
+    db_writer = PostureLogWriter(args.db)
+    sessions = [CameraSession(username, source, db_writer, stats, rules, args.backend, args.model_complexity,
+                              args.record_dir)
+                for username, source in args.sources]
+    sessions = [session for session in sessions if session.open()]
+    if not sessions:
+        db_writer.close()
+        return 1
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    pool = InferencePool(sessions, stats, args.workers, args.sessions_per_round)
+    pool.start()
+    print(f"Monitoring {len(sessions)} source(s) with {args.workers} worker(s)")
+
+    last_status = time.monotonic()
+    while not stop.wait(0.5):
+        if all(session.finished for session in sessions):
+            break
+        if time.monotonic() - last_status >= STATUS_INTERVAL:
+            last_status = time.monotonic()
+            for session in sessions:
+                print(f"{session.username}: {session.last_status or 'No data'} ({session.frames} frames)")
+            print(f"Pipeline: {stats.summary()}")
+
+    pool.stop()
+    for session in sessions:
+        session.close()
+    db_writer.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
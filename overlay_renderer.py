@@ -0,0 +1,141 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+DEGREE_SIGN = "°"
+
+
+class OverlayRenderer:
+    # Draws pose skeletons and text onto BGR frames. The skeleton comes from a
+    # (33, 4) landmark array in one cv2.polylines call for the bones and one
+    # for the joints (zero-length segments with round caps). Static text
+    # (fixed messages, label prefixes, units) is composed once from cached
+    # per-character masks into sprites that a frame copies in with one
+    # cv2.copyTo; glyph edges are thresholded at half coverage instead of
+    # blended as cv2.putText does. Text that changes every frame, such as
+    # angle values, goes through cv2.putText: building a sprite for a string
+    # that is drawn once costs more than putText itself.
+
+    def __init__(self, connections, landmark_color=(0, 255, 0), connection_color=(0, 0, 255), thickness=2,
+                 radius=2, min_visibility=0.5, font=cv2.FONT_HERSHEY_SIMPLEX, cache_size=256):
+        self.connections = np.array(sorted(connections), dtype=np.intp).reshape(-1, 2)
+        self.landmark_color = landmark_color
+        self.connection_color = connection_color
+        self.thickness = thickness
+        # A round-capped zero-length segment this thick covers a circle of
+        # `radius` drawn with `thickness`.
+        self.dot_thickness = 2 * radius + thickness
+        self.min_visibility = min_visibility
+        self.font = font
+        self.cache_size = cache_size
+        self._glyphs = {}
+        self._advances = {}
+        self._sprites = OrderedDict()
+
+    def skeleton(self, img, landmarks):
+        # landmarks are normalized to this frame; joints below min_visibility
+        # or outside the frame are skipped along with their bones.
+        if landmarks is None:
+            return img
+        height, width = img.shape[:2]
+        xy = np.nan_to_num(landmarks[:, :2], nan=-1.0)
+        visible = ((landmarks[:, 3] >= self.min_visibility) & (xy >= 0.0).all(axis=1) & (xy <= 1.0).all(axis=1))
+        points = np.minimum((xy * (width, height)).astype(np.int32), (width - 1, height - 1))
+
+        bones = self.connections[visible[self.connections].all(axis=1)]
+        if len(bones):
+            cv2.polylines(img, points[bones], False, self.connection_color, self.thickness)
+        joints = points[visible]
+        if len(joints):
+            cv2.polylines(img, np.repeat(joints[:, np.newaxis], 2, axis=1), False, self.landmark_color,
+                          self.dot_thickness)
+        return img
+
+    def text(self, img, text, org, scale, color, thickness=1):
+        # Draws static text from its cached sprite. Same placement as
+        # cv2.putText: org is the left end of the baseline. Returns the x
+        # where the next piece of text on the line starts.
+        patch, mask, ascent, advance = self._sprite(text, scale, color, thickness)
+        # Each glyph mask starts `thickness` pixels left of its pen.
+        x0, y0 = org[0] - thickness, org[1] - ascent
+        height, width = img.shape[:2]
+        sprite_height, sprite_width = mask.shape
+        if 0 <= x0 and 0 <= y0 and x0 + sprite_width <= width and y0 + sprite_height <= height:
+            cv2.copyTo(patch, mask, img[y0:y0 + sprite_height, x0:x0 + sprite_width])
+            return org[0] + advance
+        left, top = max(0, -x0), max(0, -y0)
+        right, bottom = min(sprite_width, width - x0), min(sprite_height, height - y0)
+        if left < right and top < bottom:
+            region = img[y0 + top:y0 + bottom, x0 + left:x0 + right]
+            cv2.copyTo(patch[top:bottom, left:right], mask[top:bottom, left:right], region)
+        return org[0] + advance
+
+    def dynamic_text(self, img, text, org, scale, color, thickness=1):
+        # Draws text that changes from frame to frame with cv2.putText, without
+        # touching the sprite cache. Returns the x where the next piece starts.
+        cv2.putText(img, text, org, self.font, scale, color, thickness)
+        return org[0] + self._advance(text, scale, thickness)
+
+    def _advance(self, text, scale, thickness):
+        advances = self._advances.get((scale, thickness))
+        if advances is None:
+            advances = self._advances[(scale, thickness)] = {}
+        total = 0
+        for char in text:
+            advance = advances.get(char)
+            if advance is None:
+                advance = advances[char] = self._glyph(char, scale, thickness)[2]
+            total += advance
+        return total
+
+    def _glyph(self, char, scale, thickness):
+        # (mask, ascent, advance) with the pen at (thickness, ascent).
+        key = (char, scale, thickness)
+        glyph = self._glyphs.get(key)
+        if glyph is not None:
+            return glyph
+        pad = thickness
+        if char == DEGREE_SIGN:
+            # Hershey fonts have no degree sign; draw a small ring instead.
+            (digit_width, digit_height), _ = cv2.getTextSize("0", self.font, scale, thickness)
+            radius = max(2, digit_height // 5)
+            advance = 2 * radius + 2 * thickness
+            mask = np.zeros((digit_height + 2 * pad, advance + 2 * pad), dtype=np.uint8)
+            cv2.circle(mask, (pad + advance // 2, pad + radius + thickness // 2), radius, 255,
+                       max(1, thickness // 2))
+            ascent = pad + digit_height
+        else:
+            (width, height), baseline = cv2.getTextSize(char, self.font, scale, thickness)
+            # getTextSize adds the stroke overhang once per string, not per glyph.
+            advance = cv2.getTextSize(char * 2, self.font, scale, thickness)[0][0] - width
+            mask = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+            cv2.putText(mask, char, (pad, pad + height), self.font, scale, 255, thickness)
+            ascent = pad + height
+        glyph = self._glyphs[key] = (np.where(mask >= 128, 255, 0).astype(np.uint8), ascent, advance)
+        return glyph
+
+    def _sprite(self, text, scale, color, thickness):
+        key = (text, scale, color, thickness)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        glyphs = [self._glyph(char, scale, thickness) for char in text]
+        ascent = max((glyph[1] for glyph in glyphs), default=0)
+        descent = max((mask.shape[0] - glyph_ascent for mask, glyph_ascent, _ in glyphs), default=0)
+        offsets = np.cumsum([0] + [advance for _, _, advance in glyphs[:-1]])
+        width = max((x + glyph[0].shape[1] for x, glyph in zip(offsets, glyphs)), default=0)
+        mask = np.zeros((ascent + descent, width), dtype=np.uint8)
+        for x, (glyph_mask, glyph_ascent, _) in zip(offsets, glyphs):
+            top = ascent - glyph_ascent
+            target = mask[top:top + glyph_mask.shape[0], x:x + glyph_mask.shape[1]]
+            np.maximum(target, glyph_mask, out=target)
+        patch = np.empty(mask.shape + (3,), dtype=np.uint8)
+        patch[:] = color
+        advance = sum(glyph_advance for _, _, glyph_advance in glyphs)
+        sprite = self._sprites[key] = (patch, mask, ascent, advance)
+        if len(self._sprites) > self.cache_size:
+            self._sprites.popitem(last=False)
+        return sprite
@@ -0,0 +1,91 @@
+import cv2
+import mediapipe as mp
+import numpy as np
+
+mp_pose = mp.solutions.pose
+mp_holistic = mp.solutions.holistic
+
+NUM_LANDMARKS = 33
+POSE_CONNECTIONS = mp_pose.POSE_CONNECTIONS
+
+
+def landmarks_to_array(pose_landmarks):
+    return np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in pose_landmarks.landmark],
+                    dtype=np.float32)
+
+
+class PoseEstimator:
+    name = None
+
+    def __init__(self, model_complexity=1, min_detection_confidence=0.5,
+                 min_tracking_confidence=0.5):
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self._graph = self._build()
+
+    def _build(self):
+        raise NotImplementedError
+
+    def process(self, rgb_frame):
+        return self._graph.process(rgb_frame)
+
+    def estimate(self, bgr_frame):
+        # Returns the (33, 4) landmark array, or None when nobody is in frame,
+        # together with the raw MediaPipe results for drawing.
+        rgb_frame = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+        results = self.process(rgb_frame)
+        if not results.pose_landmarks:
+            return None, results
+        return landmarks_to_array(results.pose_landmarks), results
+
+    def close(self):
+        if self._graph is not None:
+            self._graph.close()
+            self._graph = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class PoseBackend(PoseEstimator):
+    # Body pose only: no face mesh, no hand models, no segmentation mask.
+    name = "pose"
+
+    def _build(self):
+        return mp_pose.Pose(static_image_mode=False,
+                            model_complexity=self.model_complexity,
+                            smooth_landmarks=True,
+                            enable_segmentation=False,
+                            min_detection_confidence=self.min_detection_confidence,
+                            min_tracking_confidence=self.min_tracking_confidence)
+
+
+class HolisticBackend(PoseEstimator):
+    name = "holistic"
+
+    def _build(self):
+        return mp_holistic.Holistic(static_image_mode=False,
+                                    model_complexity=self.model_complexity,
+                                    smooth_landmarks=True,
+                                    enable_segmentation=False,
+                                    refine_face_landmarks=False,
+                                    min_detection_confidence=self.min_detection_confidence,
+                                    min_tracking_confidence=self.min_tracking_confidence)
+
+
+BACKENDS = {
+    PoseBackend.name: PoseBackend,
+    HolisticBackend.name: HolisticBackend,
+}
+
+
+def create_pose_estimator(backend="pose", model_complexity=1, **kwargs):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown pose backend '{backend}', expected one of: {', '.join(BACKENDS)}")
+    if model_complexity not in (0, 1, 2):
+        raise ValueError("model_complexity must be 0, 1 or 2")
+    return BACKENDS[backend](model_complexity=model_complexity, **kwargs)
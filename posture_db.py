@@ -0,0 +1,378 @@
+import queue
+import sqlite3
+import threading
+import time
+
+GOOD_POSTURE = "Good Posture"
+SLOUCH_DETECTED = "Slouch Detected"
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# History rollup resolutions. Bucket boundaries follow local time, so a day
+# bucket runs from local midnight to local midnight.
+MINUTE = "minute"
+HOUR = "hour"
+DAY = "day"
+RESOLUTIONS = {MINUTE: 60, HOUR: 3600, DAY: 86400}
+
+
+def create_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS posture_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            timestamp TEXT,
+            status TEXT,
+            duration REAL DEFAULT 0.0
+        )
+    ''')
+    # Per-frame verdicts from offline scoring; offset is seconds into the source.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS posture_frame_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            source TEXT,
+            frame_index INTEGER,
+            offset REAL,
+            status TEXT,
+            angle_khs REAL,
+            angle_hse REAL,
+            angle_sev REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_posture_log_username_timestamp
+        ON posture_log (username, timestamp)
+    ''')
+    # Rows written by offline scoring name the recording they came from, so
+    # re-scoring it can replace them.
+    if "source" not in {row[1] for row in conn.execute("PRAGMA table_info(posture_log)")}:
+        conn.execute("ALTER TABLE posture_log ADD COLUMN source TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posture_log_source ON posture_log (source)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posture_frame_log_source ON posture_frame_log (source)")
+    create_user_stats(conn)
+    create_history(conn)
+    conn.commit()
+
+
+def create_user_stats(conn):
+    # Per-user running totals kept in step with posture_log by triggers, so
+    # reports and rankings never have to aggregate the full log.
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posture_user_stats'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS posture_user_stats (
+            username TEXT PRIMARY KEY,
+            good_time REAL NOT NULL DEFAULT 0.0,
+            total_time REAL NOT NULL DEFAULT 0.0,
+            good_ratio REAL NOT NULL DEFAULT 0.0
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_posture_user_stats_ratio
+        ON posture_user_stats (good_ratio)
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_posture_log_insert_stats
+        AFTER INSERT ON posture_log
+        WHEN NEW.username IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO posture_user_stats (username) VALUES (NEW.username);
+            UPDATE posture_user_stats SET
+                good_time = good_time + {_good_duration("NEW")},
+                total_time = total_time + COALESCE(NEW.duration, 0),
+                good_ratio = CASE WHEN total_time + COALESCE(NEW.duration, 0) > 0
+                    THEN (good_time + {_good_duration("NEW")}) * 100.0
+                         / (total_time + COALESCE(NEW.duration, 0))
+                    ELSE 0 END
+            WHERE username = NEW.username;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_posture_log_delete_stats
+        AFTER DELETE ON posture_log
+        WHEN OLD.username IS NOT NULL
+        BEGIN
+            UPDATE posture_user_stats SET
+                good_time = good_time - {_good_duration("OLD")},
+                total_time = total_time - COALESCE(OLD.duration, 0),
+                good_ratio = CASE WHEN total_time - COALESCE(OLD.duration, 0) > 0
+                    THEN (good_time - {_good_duration("OLD")}) * 100.0
+                         / (total_time - COALESCE(OLD.duration, 0))
+                    ELSE 0 END
+            WHERE username = OLD.username;
+        END
+    ''')
+    if not exists:
+        # First run against an existing database: seed from the full log once.
+        conn.execute(f'''
+            INSERT INTO posture_user_stats (username, good_time, total_time, good_ratio)
+            SELECT username, good_time, total_time,
+                   CASE WHEN total_time > 0 THEN good_time * 100.0 / total_time ELSE 0 END
+            FROM (
+                SELECT username,
+                       SUM(CASE WHEN status = '{GOOD_POSTURE}' THEN COALESCE(duration, 0) ELSE 0 END) AS good_time,
+                       SUM(COALESCE(duration, 0)) AS total_time
+                FROM posture_log
+                WHERE username IS NOT NULL
+                GROUP BY username
+            )
+        ''')
+
+
+def create_history(conn):
+    # Integer epoch bounds for every posture_log row plus minute, hour and day
+    # rollups that the writers keep up to date, so range and trend queries
+    # read a few buckets instead of scanning the log.
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(posture_log)")}
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS posture_history (
+            resolution TEXT NOT NULL,
+            username TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            good_time REAL NOT NULL DEFAULT 0.0,
+            slouch_time REAL NOT NULL DEFAULT 0.0,
+            slouch_events INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (resolution, username, bucket)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_posture_history_bucket
+        ON posture_history (resolution, bucket)
+    ''')
+    if "ended_at" not in columns:
+        # Existing database: derive the epoch bounds from the local-time text
+        # timestamp, which marks the end of each segment, and roll up once.
+        conn.execute("ALTER TABLE posture_log ADD COLUMN started_at INTEGER")
+        conn.execute("ALTER TABLE posture_log ADD COLUMN ended_at INTEGER")
+        conn.execute('''
+            UPDATE posture_log
+            SET ended_at = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+            WHERE timestamp IS NOT NULL
+        ''')
+        conn.execute('''
+            UPDATE posture_log
+            SET started_at = ended_at - CAST(ROUND(COALESCE(duration, 0)) AS INTEGER)
+            WHERE ended_at IS NOT NULL
+        ''')
+        rebuild_history(conn)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_posture_log_username_started_at
+        ON posture_log (username, started_at)
+    ''')
+
+
+def bucket_start(epoch, resolution):
+    # Epoch of the local minute, hour or day containing epoch.
+    local = time.localtime(epoch)
+    if resolution == DAY:
+        return int(time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1)))
+    size = RESOLUTIONS[resolution]
+    return int((epoch + local.tm_gmtoff) // size * size - local.tm_gmtoff)
+
+
+def next_bucket(bucket, resolution):
+    if resolution == DAY:
+        # Days are 23 or 25 hours long across DST changes.
+        local = time.localtime(bucket)
+        return int(time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1)))
+    return bucket + RESOLUTIONS[resolution]
+
+
+def record_history(conn, segments, sign=1):
+    # Adds (username, ended_at, status, duration) segments to the rollups,
+    # splitting each across the buckets it spans, or takes them back out with
+    # sign=-1. A slouch event counts in the bucket where the segment starts.
+    # The caller commits.
+    totals = {}
+    for username, ended_at, status, duration in segments:
+        if username is None or ended_at is None or not duration or duration <= 0:
+            continue
+        good = status == GOOD_POSTURE
+        started_at = ended_at - duration
+        for resolution in RESOLUTIONS:
+            bucket = bucket_start(started_at, resolution)
+            first = True
+            while bucket < ended_at:
+                following = next_bucket(bucket, resolution)
+                seconds = min(ended_at, following) - max(started_at, bucket)
+                entry = totals.setdefault((resolution, username, bucket), [0.0, 0.0, 0])
+                entry[0 if good else 1] += sign * seconds
+                if first and not good:
+                    entry[2] += sign
+                first = False
+                bucket = following
+    conn.executemany('''
+        INSERT INTO posture_history (resolution, username, bucket, good_time, slouch_time, slouch_events)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (resolution, username, bucket) DO UPDATE SET
+            good_time = good_time + excluded.good_time,
+            slouch_time = slouch_time + excluded.slouch_time,
+            slouch_events = slouch_events + excluded.slouch_events
+    ''', [key + tuple(entry) for key, entry in totals.items()])
+
+
+def rebuild_history(conn, chunk_size=10000):
+    # Recomputes every rollup from posture_log, e.g. after rows were deleted.
+    conn.execute("DELETE FROM posture_history")
+    cursor = conn.execute('''
+        SELECT username, ended_at, status, duration FROM posture_log
+        WHERE username IS NOT NULL AND ended_at IS NOT NULL
+    ''')
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        record_history(conn, rows)
+
+
+def log_rows(records, source=None):
+    # Turns (username, ended_at, status, duration) records, with ended_at in
+    # epoch seconds, into posture_log rows and matching history segments.
+    rows = []
+    segments = []
+    for username, ended_at, status, duration in records:
+        ended_at = int(round(ended_at))
+        started_at = ended_at - int(round(duration or 0))
+        rows.append((username, time.strftime(TIMESTAMP_FORMAT, time.localtime(ended_at)), status, duration,
+                     started_at, ended_at, source))
+        segments.append((username, ended_at, status, duration))
+    return rows, segments
+
+
+def insert_log(conn, records, source=None):
+    # Inserts posture_log rows and updates the rollups; the caller commits.
+    rows, segments = log_rows(records, source)
+    conn.executemany(
+        "INSERT INTO posture_log (username, timestamp, status, duration, started_at, ended_at, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    record_history(conn, segments)
+
+
+def delete_source(conn, source):
+    # Removes everything an earlier scoring run of source wrote: its log rows
+    # (the delete trigger updates the user totals), their share of the
+    # rollups and its per-frame rows. The caller commits.
+    segments = conn.execute(
+        "SELECT username, ended_at, status, duration FROM posture_log WHERE source = ?", (source,)
+    ).fetchall()
+    record_history(conn, segments, sign=-1)
+    conn.execute("DELETE FROM posture_log WHERE source = ?", (source,))
+    conn.execute("DELETE FROM posture_frame_log WHERE source = ?", (source,))
+
+
+def _good_duration(row):
+    return f"CASE WHEN {row}.status = '{GOOD_POSTURE}' THEN COALESCE({row}.duration, 0) ELSE 0 END"
+
+
+def get_user_ranking(conn, username):
+    # Returns (good_ratio, rank, total_users) from the aggregate table, or
+    # None when the user has no logged time. Users with equal ratios share
+    # the higher rank.
+    row = conn.execute(
+        "SELECT good_ratio FROM posture_user_stats WHERE username = ?", (username,)
+    ).fetchone()
+    if row is None:
+        return None
+    good_ratio = row[0]
+    better = conn.execute(
+        "SELECT COUNT(*) FROM posture_user_stats WHERE good_ratio > ?", (good_ratio,)
+    ).fetchone()[0]
+    total_users = conn.execute("SELECT COUNT(*) FROM posture_user_stats").fetchone()[0]
+    return good_ratio, better + 1, total_users
+
+
+def enable_wal(conn):
+    # WAL lets the GUI read while the writer thread commits, and NORMAL
+    # synchronous mode only fsyncs at checkpoints.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+
+def connect(db_filename="posture_data.db", check_same_thread=True):
+    conn = sqlite3.connect(db_filename, check_same_thread=check_same_thread)
+    enable_wal(conn)
+    create_schema(conn)
+    return conn
+
+
+class PostureLogWriter(threading.Thread):
+    # Write-behind logger for posture_log. Records are queued from any thread
+    # and committed in batches on this thread, either once batch_size rows are
+    # pending or flush_interval seconds after the first pending row. Each
+    # batch updates the history rollups in the same transaction.
+
+    _STOP = object()
+
+    def __init__(self, db_filename="posture_data.db", batch_size=50, flush_interval=1.0, stats=None):
+        super().__init__(daemon=True)
+        self.db_filename = db_filename
+        self.stats = stats
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records = queue.Queue()
+        self.written = 0
+        self.start()
+
+    def log(self, username, ended_at, status, duration):
+        # ended_at is the end of the segment in epoch seconds.
+        self.records.put((username, ended_at, status, duration))
+
+    def flush(self, timeout=5.0):
+        # Blocks until everything queued before this call is committed.
+        done = threading.Event()
+        self.records.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        self.records.put(self._STOP)
+        self.join(timeout)
+
+    def _commit(self, conn, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            insert_log(conn, batch)
+            conn.commit()
+            self.written += len(batch)
+            if self.stats is not None:
+                self.stats.record("db_commit", time.perf_counter() - started)
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"DB write error, dropped {len(batch)} records: {e}")
+        batch.clear()
+
+    def run(self):
+        conn = connect(self.db_filename)
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self.records.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is self._STOP:
+                    break
+                if isinstance(item, threading.Event):
+                    self._commit(conn, batch)
+                    deadline = None
+                    item.set()
+                    continue
+                if item is not None:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+                if len(batch) >= self.batch_size or (deadline is not None and time.monotonic() >= deadline):
+                    self._commit(conn, batch)
+                    deadline = None
+        finally:
+            self._commit(conn, batch)
+            conn.close()
@@ -0,0 +1,15 @@
+import numpy as np
+
+# The SEV angle is measured against a point straight above the ear.
+VIRTUAL_POINT_OFFSET = 0.1
+
+
+def angles_between(vec1, vec2, vec3):
+    # Angle at vec2 in degrees, broadcast over any leading axes.
+    vec21 = vec1 - vec2
+    vec23 = vec3 - vec2
+    dot = np.einsum('...i,...i->...', vec21, vec23)
+    norms = np.linalg.norm(vec21, axis=-1) * np.linalg.norm(vec23, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine = np.clip(dot / norms, -1.0, 1.0)
+    return np.where(norms == 0, 0.0, np.degrees(np.arccos(cosine)))
@@ -0,0 +1,152 @@
+import argparse
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from posture_db import DAY, HOUR, MINUTE, RESOLUTIONS, bucket_start, connect, next_bucket, rebuild_history
+
+# good_time and slouch_time are in seconds; good_ratio is a percentage.
+HistoryBucket = namedtuple("HistoryBucket", ["bucket", "good_time", "slouch_time", "slouch_events", "good_ratio"])
+UserTotals = namedtuple("UserTotals", ["username", "good_time", "slouch_time", "slouch_events", "good_ratio"])
+
+
+def _ratio(good_time, slouch_time):
+    total = good_time + slouch_time
+    return good_time * 100.0 / total if total > 0 else 0.0
+
+
+def _ceil(epoch, resolution):
+    start = bucket_start(epoch, resolution)
+    return start if start == epoch else next_bucket(start, resolution)
+
+
+def cover(start, end):
+    # Splits [start, end), rounded inward to whole minutes, into the fewest
+    # (resolution, first bucket, end) runs of whole buckets: minutes up to the
+    # first full hour, hours up to the first full day, days, then back down.
+    start = _ceil(int(start), MINUTE)
+    end = bucket_start(int(end), MINUTE)
+    if start >= end:
+        return []
+    first_hour, last_hour = _ceil(start, HOUR), bucket_start(end, HOUR)
+    if first_hour >= last_hour:
+        return [(MINUTE, start, end)]
+    first_day, last_day = _ceil(first_hour, DAY), bucket_start(last_hour, DAY)
+    if first_day >= last_day:
+        runs = [(MINUTE, start, first_hour), (HOUR, first_hour, last_hour), (MINUTE, last_hour, end)]
+    else:
+        runs = [(MINUTE, start, first_hour), (HOUR, first_hour, first_day), (DAY, first_day, last_day),
+                (HOUR, last_day, last_hour), (MINUTE, last_hour, end)]
+    return [run for run in runs if run[1] < run[2]]
+
+
+def _user_filter(username):
+    return (" AND username = ?", (username,)) if username is not None else ("", ())
+
+
+def history(conn, resolution=DAY, start=None, end=None, username=None):
+    # Buckets of one resolution whose start lies in [start, end), summed over
+    # all users unless username is given.
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}', expected one of: {', '.join(RESOLUTIONS)}")
+    where, params = _user_filter(username)
+    rows = conn.execute(f'''
+        SELECT bucket, SUM(good_time), SUM(slouch_time), SUM(slouch_events)
+        FROM posture_history
+        WHERE resolution = ? AND bucket >= ? AND bucket < ?{where}
+        GROUP BY bucket
+        ORDER BY bucket
+    ''', (resolution, start if start is not None else 0, end if end is not None else 2 ** 62, *params))
+    return [HistoryBucket(bucket, good, slouch, events, _ratio(good, slouch))
+            for bucket, good, slouch, events in rows]
+
+
+def user_totals(conn, start, end, username=None):
+    # Per-user totals over [start, end) to the minute, best ratio first,
+    # read from the coarsest buckets that tile the range.
+    where, params = _user_filter(username)
+    totals = {}
+    for resolution, first, last in cover(start, end):
+        rows = conn.execute(f'''
+            SELECT username, SUM(good_time), SUM(slouch_time), SUM(slouch_events)
+            FROM posture_history
+            WHERE resolution = ? AND bucket >= ? AND bucket < ?{where}
+            GROUP BY username
+        ''', (resolution, first, last, *params))
+        for name, good, slouch, events in rows:
+            entry = totals.setdefault(name, [0.0, 0.0, 0])
+            entry[0] += good
+            entry[1] += slouch
+            entry[2] += events
+    return sorted((UserTotals(name, good, slouch, events, _ratio(good, slouch))
+                   for name, (good, slouch, events) in totals.items()),
+                  key=lambda totals: totals.good_ratio, reverse=True)
+
+
+def trend(buckets, resolution=DAY):
+    # Least-squares slope of the good ratio in percentage points per bucket
+    # length, over buckets with logged time; None with fewer than two.
+    size = RESOLUTIONS[resolution]
+    points = [(b.bucket / size, b.good_ratio) for b in buckets if b.good_time + b.slouch_time > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def parse_time(value):
+    # Local "YYYY-MM-DD" or "YYYY-MM-DD HH:MM[:SS]" to epoch seconds.
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def format_bucket(bucket, resolution):
+    formats = {MINUTE: "%Y-%m-%d %H:%M", HOUR: "%Y-%m-%d %H:00", DAY: "%Y-%m-%d"}
+    return time.strftime(formats[resolution], time.localtime(bucket))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Posture history reports from the rolled-up database.")
+    parser.add_argument("--db", default="posture_data.db", help="SQLite database")
+    parser.add_argument("--user", help="Only this user (default: all users combined)")
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS), default=DAY)
+    parser.add_argument("--since", type=parse_time, help="Start, local time (default: 7 days ago)")
+    parser.add_argument("--until", type=parse_time, help="End, local time (default: now)")
+    parser.add_argument("--users", action="store_true", help="Rank users over the range instead of a timeline")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all rollups from posture_log first")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    until = args.until if args.until is not None else int(time.time())
+    since = args.since if args.since is not None else until - 7 * RESOLUTIONS[DAY]
+    conn = connect(args.db)
+    try:
+        if args.rebuild:
+            rebuild_history(conn)
+            conn.commit()
+
+        if args.users:
+            for rank, totals in enumerate(user_totals(conn, since, until, args.user), 1):
+                print(f"{rank:>3}. {totals.username}: good {totals.good_time:.0f}s, "
+                      f"slouch {totals.slouch_time:.0f}s ({totals.slouch_events} times), "
+                      f"ratio {totals.good_ratio:.1f}%")
+            return 0
+
+        buckets = history(conn, args.resolution, bucket_start(since, args.resolution), until, args.user)
+        for b in buckets:
+            print(f"{format_bucket(b.bucket, args.resolution)}  good {b.good_time:>7.0f}s  "
+                  f"slouch {b.slouch_time:>7.0f}s  events {b.slouch_events:>4}  ratio {b.good_ratio:5.1f}%")
+        slope = trend(buckets, args.resolution)
+        if slope is not None:
+            print(f"Trend: {slope:+.2f} points per {args.resolution}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import json
+import os
+
+import numpy as np
+
+from posture_geometry import VIRTUAL_POINT_OFFSET, angles_between
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "posture_rules.json")
+
+# Joint names usable in a rule, as (left, right) MediaPipe landmark indices.
+JOINTS = {
+    "nose": (0, 0),
+    "eye": (2, 5),
+    "ear": (7, 8),
+    "mouth": (9, 10),
+    "shoulder": (11, 12),
+    "elbow": (13, 14),
+    "wrist": (15, 16),
+    "hip": (23, 24),
+    "knee": (25, 26),
+    "ankle": (27, 28),
+    "heel": (29, 30),
+    "foot": (31, 32),
+}
+# "vertical" as the last joint is a virtual point straight above the vertex.
+VERTICAL = "vertical"
+
+SIDES = {"left": 0, "right": 1, "best": 2}
+
+
+class PostureRules:
+    # A set of joint-angle rules compiled into index and threshold arrays, so
+    # every rule on both body sides is evaluated in one vectorized pass no
+    # matter how many rules are configured.
+
+    def __init__(self, rules, side="best", virtual_offset=VIRTUAL_POINT_OFFSET):
+        if not rules:
+            raise ValueError("At least one posture rule is required")
+        self.names = []
+        self.messages = []
+        indices = []
+        vertical = []
+        sides = []
+        minimums = []
+        maximums = []
+        for rule in rules:
+            name = rule.get("name")
+            joints = rule.get("joints", [])
+            if not name or len(joints) != 3:
+                raise ValueError(f"Rule {rule!r} needs a name and exactly three joints")
+            for joint in joints[:2]:
+                if joint not in JOINTS:
+                    raise ValueError(f"Rule {name}: unknown joint '{joint}'")
+            if joints[2] != VERTICAL and joints[2] not in JOINTS:
+                raise ValueError(f"Rule {name}: unknown joint '{joints[2]}'")
+            if "min" not in rule and "max" not in rule:
+                raise ValueError(f"Rule {name}: needs a min and/or max angle")
+            rule_side = rule.get("side", side)
+            if rule_side not in SIDES:
+                raise ValueError(f"Rule {name}: side must be one of {', '.join(SIDES)}")
+
+            is_vertical = joints[2] == VERTICAL
+            # The virtual point is built from the vertex, so reuse its index.
+            last = joints[1] if is_vertical else joints[2]
+            indices.append([[JOINTS[joints[0]][s], JOINTS[joints[1]][s], JOINTS[last][s]] for s in (0, 1)])
+            vertical.append(is_vertical)
+            sides.append(SIDES[rule_side])
+            minimums.append(rule.get("min", -np.inf))
+            maximums.append(rule.get("max", np.inf))
+            self.names.append(name)
+            self.messages.append(rule.get("message", f"FIX {name.upper()}!"))
+
+        # (side, rule, joint) -> landmark index
+        self.indices = np.transpose(np.array(indices, dtype=np.intp), (1, 0, 2))
+        self.vertical = np.array(vertical, dtype=bool)
+        self.sides = np.array(sides, dtype=np.intp)
+        self.minimums = np.array(minimums, dtype=np.float32)
+        self.maximums = np.array(maximums, dtype=np.float32)
+        self.virtual_offset = np.array([0.0, -virtual_offset], dtype=np.float32)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("rules", []), side=config.get("side", "best"),
+                   virtual_offset=config.get("virtual_offset", VIRTUAL_POINT_OFFSET))
+
+    def __len__(self):
+        return len(self.names)
+
+    def angles(self, landmarks):
+        # landmarks: (33, D) or (N, 33, D). Returns (R,) or (N, R) angles, each
+        # rule measured on its configured side; "best" picks, per frame, the
+        # side whose joints have the higher total visibility.
+        points = np.asarray(landmarks, dtype=np.float32)
+        single = points.ndim == 2
+        if single:
+            points = points[np.newaxis]
+
+        joints = points[:, self.indices, :2]  # (N, side, rule, joint, xy)
+        first, vertex, last = joints[..., 0, :], joints[..., 1, :], joints[..., 2, :]
+        last = np.where(self.vertical[:, np.newaxis], vertex + self.virtual_offset, last)
+        both_sides = angles_between(first, vertex, last)  # (N, side, rule)
+
+        chosen = self._chosen_sides(points)
+        angles = np.take_along_axis(both_sides, chosen[:, np.newaxis, :], axis=1)[:, 0]
+        return angles[0] if single else angles
+
+    def _chosen_sides(self, points):
+        # (N, R) side index of every rule in every frame of (N, 33, D) points.
+        if points.shape[-1] >= 4:
+            visibility = np.nan_to_num(points[:, self.indices, 3]).sum(axis=-1)
+            best = (visibility[:, 1] > visibility[:, 0]).astype(np.intp)
+        else:
+            best = np.zeros((len(points), len(self)), dtype=np.intp)
+        return np.where(self.sides == SIDES["best"], best, self.sides)
+
+    def measured_landmarks(self, landmarks):
+        # Indices of the landmarks the rules read on one (33, D) frame: only
+        # the side each rule picked, not the occluded far side.
+        points = np.asarray(landmarks, dtype=np.float32)[np.newaxis]
+        chosen = self._chosen_sides(points)[0]
+        return np.unique(self.indices[chosen, np.arange(len(self))])
+
+    def check(self, angles, band=0.0):
+        # Which rules pass; band widens (positive) or narrows (negative) every range.
+        return (angles >= self.minimums - band) & (angles <= self.maximums + band)
+
+    def evaluate(self, landmarks):
+        angles = self.angles(landmarks)
+        return angles, self.check(angles)
+
+    def is_slouching(self, landmarks):
+        # Frames with missing or non-finite landmarks are never reported as slouching.
+        angles, valid = self.evaluate(landmarks)
+        measured = np.isfinite(angles).all(axis=-1)
+        return measured & ~valid.all(axis=-1)
+
+    def feedback(self, valid):
+        # Message of the first failing rule, or None when all pass.
+        failing = np.flatnonzero(~np.asarray(valid))
+        return self.messages[failing[0]] if len(failing) else None
+
+
+def load_rules(path=None):
+    # POSTURE_RULES in the environment overrides the bundled posture_rules.json.
+    path = path or os.environ.get("POSTURE_RULES") or DEFAULT_RULES_PATH
+    with open(path) as f:
+        return PostureRules.from_config(json.load(f))
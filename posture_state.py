@@ -0,0 +1,98 @@
+import numpy as np
+
+from posture_rules import load_rules
+
+
+class OneEuroFilter:
+    # One Euro filter applied element-wise to an array of landmark coordinates:
+    # heavy smoothing while still, little lag when moving quickly.
+
+    def __init__(self, min_cutoff=1.0, beta=1.0, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.derivative = None
+        self.timestamp = None
+
+    @staticmethod
+    def _alpha(dt, cutoff):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, value, timestamp):
+        value = np.asarray(value, dtype=np.float32)
+        if self.value is None or self.value.shape != value.shape or timestamp <= self.timestamp:
+            self.value = value.copy()
+            self.derivative = np.zeros_like(value)
+            self.timestamp = timestamp
+            return self.value
+
+        dt = timestamp - self.timestamp
+        alpha_d = self._alpha(dt, self.d_cutoff)
+        self.derivative += alpha_d * ((value - self.value) / dt - self.derivative)
+        alpha = self._alpha(dt, self.min_cutoff + self.beta * np.abs(self.derivative))
+        self.value += alpha * (value - self.value)
+        self.timestamp = timestamp
+        return self.value
+
+
+class PostureStateEstimator:
+    # Streaming posture verdict. Each frame's landmarks are smoothed, every
+    # rule has a hysteresis band around its thresholds, and the overall state
+    # only flips after the new verdict has held for min_dwell seconds. Work
+    # per frame is constant.
+
+    def __init__(self, rules=None, hysteresis=3.0, min_dwell=1.5, landmark_filter=None):
+        self.rules = rules or load_rules()
+        self.hysteresis = hysteresis
+        self.min_dwell = min_dwell
+        self.landmark_filter = landmark_filter or OneEuroFilter()
+        self.reset()
+
+    def reset(self):
+        self.landmark_filter.reset()
+        self.angles = None
+        self.valid = np.ones(len(self.rules), dtype=bool)
+        self.slouching = False
+        self.candidate_since = None
+        self.changed_at = None
+
+    def _update_valid(self, angles):
+        # Leaving the valid state needs the angle to pass a threshold by the
+        # band; coming back needs it to clear the threshold by the band.
+        stay_valid = self.rules.check(angles, self.hysteresis)
+        become_valid = self.rules.check(angles, -self.hysteresis)
+        self.valid = np.where(self.valid, stay_valid, become_valid)
+
+    def update(self, landmarks, timestamp):
+        # Returns the debounced slouch state after this frame.
+        if landmarks is None:
+            self.landmark_filter.reset()
+            self.angles = None
+            candidate = False
+        else:
+            smoothed = np.array(landmarks, dtype=np.float32)
+            smoothed[:, :2] = self.landmark_filter(smoothed[:, :2], timestamp)
+            angles = self.rules.angles(smoothed)
+            if np.isfinite(angles).all():
+                self.angles = angles
+                self._update_valid(angles)
+                candidate = not self.valid.all()
+            else:
+                self.angles = None
+                candidate = False
+
+        if candidate == self.slouching:
+            self.candidate_since = None
+        else:
+            if self.candidate_since is None:
+                self.candidate_since = timestamp
+            if timestamp - self.candidate_since >= self.min_dwell:
+                self.slouching = candidate
+                self.changed_at = timestamp
+                self.candidate_since = None
+        return self.slouching
@@ -1,15 +1,29 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import namedtuple
+
 import cv2
-import numpy as np
-import mediapipe as mp
-import serial.tools.list_ports
+from frame_pipeline import CaptureThread, FrameRing, LatestQueue
+from overlay_renderer import DEGREE_SIGN, OverlayRenderer
+from pose_estimator import POSE_CONNECTIONS, create_pose_estimator
+from posture_db import GOOD_POSTURE, SLOUCH_DETECTED, PostureLogWriter
+from posture_rules import load_rules
+from posture_state import PostureStateEstimator
+
+# "pose" runs the body model alone; "holistic" also runs face and hand models.
+POSE_BACKEND = "pose"
+POSE_MODEL_COMPLEXITY = 1
 
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose()
-mp_drawing = mp.solutions.drawing_utils
-mp_holistic = mp.solutions.holistic
+# Seconds of continuous slouching before the general alert.
+ALERT_AFTER = 3.0
 
-bad_posture_frames = 0
-ALERT_THRESHOLD = 100
+STREAM_SCHEMES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
 
 font = cv2.FONT_HERSHEY_SIMPLEX
 
@@ -21,98 +35,346 @@ light_green = (127, 233, 100)
 yellow = (0, 255, 255)
 pink = (255, 0, 255)
 
-def distance(v1, v2):
-    return np.sqrt(((v1 - v2) ** 2).sum())
+# One verdict per processed frame. timestamp is epoch seconds and offset is
+# seconds since the source started. angles maps rule names to degrees and is
+# None without a measurable pose. frame and landmarks (a (33, 4) array, or
+# None) are only for renderers and stay valid until the next event.
+VerdictEvent = namedtuple("VerdictEvent", ["index", "timestamp", "offset", "pose", "slouch", "alert", "message",
+                                           "angles", "frame", "landmarks"])
+JSON_FIELDS = ("index", "timestamp", "offset", "pose", "slouch", "alert", "message", "angles")
+
+
+def event_record(event):
+    return {field: getattr(event, field) for field in JSON_FIELDS}
+
+
+def file_frames(path):
+    # Every frame of a video file, as fast as it decodes.
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file {path}")
+    started = time.time()
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            offset = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield frame, started + offset, offset
+    finally:
+        cap.release()
+
+
+def live_frames(device):
+    # Webcam index or stream URL. A capture thread keeps only the newest
+    # frame, so a slow consumer skips frames instead of falling behind.
+    cap = cv2.VideoCapture(device)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video source {device}")
+    shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640, 3)
+    ring = FrameRing(shape)
+    # A network stream that stops delivering frames has ended; a webcam may recover.
+    capture_thread = CaptureThread(cap, ring, stop_at_eof=isinstance(device, str))
+    capture_thread.start()
+    started, started_perf = time.time(), time.perf_counter()
+    seq = -1
+    try:
+        while capture_thread.running or ring.seq > seq:
+            item = ring.checkout_latest(seq, timeout=0.5)
+            if item is None:
+                continue
+            seq, slot, frame, captured_at = item
+            try:
+                offset = captured_at - started_perf
+                yield frame, started + offset, offset
+            finally:
+                ring.release(slot)
+    finally:
+        capture_thread.stop()
+        cap.release()
+
+
+def open_source(source):
+    # "0", "1", ... is a webcam, a URL is a network stream, anything else a file.
+    if source.isdigit():
+        return live_frames(int(source))
+    if source.startswith(STREAM_SCHEMES):
+        return live_frames(source)
+    return file_frames(source)
+
+
+def stream_verdicts(frames, estimator, rules, state):
+    # Turns a generator of (frame, timestamp, offset) into VerdictEvents and
+    # closes it when the stream is closed.
+    try:
+        yield from _verdicts(frames, estimator, rules, state)
+    finally:
+        frames.close()
+
+
+def _verdicts(frames, estimator, rules, state):
+    for index, (frame, timestamp, offset) in enumerate(frames):
+        landmarks, _ = estimator.estimate(frame)
+        slouch = state.update(landmarks, offset)
+        angles = None
+        if state.angles is not None:
+            angles = {name: round(float(angle), 2) for name, angle in zip(rules.names, state.angles)}
+        alert = slouch and state.changed_at is not None and offset - state.changed_at >= ALERT_AFTER
+        message = rules.feedback(state.valid) if slouch else None
+        yield VerdictEvent(index, timestamp, offset, landmarks is not None, slouch, alert, message, angles,
+                           frame, landmarks)
+
+
+class JsonLinesSink:
+    # One JSON object per event, flushed so a pipe consumer sees it at once.
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, event):
+        self.stream.write(json.dumps(event_record(event)) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class SQLiteSink:
+    # Logs good and slouch segments to posture_log, one row per state change,
+    # through the background writer.
+
+    def __init__(self, db_filename="posture_data.db", username="posturedetection"):
+        self.username = username
+        self.writer = PostureLogWriter(db_filename)
+        self.status = None
+        self.since = None
+        self.last_timestamp = None
+
+    def write(self, event):
+        status = SLOUCH_DETECTED if event.slouch else GOOD_POSTURE
+        if status != self.status:
+            if self.status is not None:
+                self.writer.log(self.username, event.timestamp, self.status, event.timestamp - self.since)
+            self.status = status
+            self.since = event.timestamp
+        self.last_timestamp = event.timestamp
+
+    def close(self):
+        if self.status is not None:
+            self.writer.log(self.username, self.last_timestamp, self.status, self.last_timestamp - self.since)
+        self.writer.close()
+
+
+class SerialSink:
+    # Drives the Arduino; the channel only transmits state changes and heartbeats.
+
+    def __init__(self, port=None):
+        from serial_channel import BAD_POSTURE_COMMAND, GOOD_POSTURE_COMMAND, SerialChannel, find_arduino_port
+
+        port = find_arduino_port(None if port in (None, "auto") else port)
+        if port is None:
+            raise IOError("No Arduino found (pass serial:PORT or set POSTURE_SERIAL_PORT)")
+        self.commands = (GOOD_POSTURE_COMMAND, BAD_POSTURE_COMMAND)
+        self.channel = SerialChannel(port, 9600)
+
+    def write(self, event):
+        self.channel.send(self.commands[event.slouch])
+
+    def close(self):
+        self.channel.close()
+
+
+class UnixSocketSink(threading.Thread):
+    # Serves the JSON lines to every client connected to a UNIX socket. A
+    # client that is not reading skips events instead of slowing the stream.
+
+    def __init__(self, path):
+        super().__init__(daemon=True)
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        self.clients = []
+        self._lock = threading.Lock()
+        self.start()
 
-def find_angles(vec1, vec2, vec3):
-    vec1 = np.array(vec1)
-    vec2 = np.array(vec2)
-    vec3 = np.array(vec3)
+    def run(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            client.setblocking(False)
+            with self._lock:
+                self.clients.append(client)
 
-    vec21 = vec1 - vec2
-    vec23 = vec3 - vec2
+    def write(self, event):
+        data = (json.dumps(event_record(event)) + "\n").encode("utf-8")
+        with self._lock:
+            for client in list(self.clients):
+                try:
+                    sent = client.send(data)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    sent = 0
+                if sent < len(data):
+                    # Gone, or a partial line that would corrupt the stream.
+                    client.close()
+                    self.clients.remove(client)
 
-    dist_vec21 = distance(vec1, vec2)
-    dist_vec23 = distance(vec3, vec2)
+    def close(self):
+        self.server.close()
+        with self._lock:
+            for client in self.clients:
+                client.close()
+            self.clients.clear()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
 
-    if dist_vec21 == 0 or dist_vec23 == 0:
-        return 0
 
-    angle = np.degrees(np.arccos((np.dot(vec21, vec23)) / (dist_vec21 * dist_vec23)))
+def make_sink(spec, username):
+    # "stdout", "sqlite[:DB]", "serial[:PORT|auto]" or "unix:PATH".
+    kind, _, arg = spec.partition(":")
+    if kind == "stdout":
+        return JsonLinesSink()
+    if kind == "sqlite":
+        return SQLiteSink(arg or "posture_data.db", username)
+    if kind == "serial":
+        return SerialSink(arg or None)
+    if kind == "unix" and arg:
+        return UnixSocketSink(arg)
+    raise ValueError(f"Unknown sink '{spec}', expected stdout, sqlite[:DB], serial[:PORT] or unix:PATH")
 
-    return angle
 
-liveFeed = cv2.VideoCapture(0)
+class PostureOverlay:
+    # Draws the verdict, feedback, rule angles and skeleton onto a frame.
 
-with mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5) as holistic:
-    while liveFeed.isOpened():
-        _, img = liveFeed.read()
+    def __init__(self, rules):
+        self.rules = rules
+        self.angle_colors = [green, blue, pink]
+        self.renderer = OverlayRenderer(POSE_CONNECTIONS, landmark_color=green, connection_color=yellow, font=font)
 
-        rgbImage = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        results = holistic.process(rgbImage)
-        rs = results.pose_landmarks
+    def draw(self, img, event):
+        if event.angles is not None:
+            if not event.slouch:
+                self.renderer.text(img, "GOOD POSTURE!", (350, 50), 1, green, 2)
+            else:
+                # Specific feedback based on which rule is failing
+                if event.message:
+                    self.renderer.text(img, event.message, (350, 50), 1, red, 2)
 
-        if rs:
-            landmarks = rs.landmark
+                # General alert if bad posture persists
+                if event.alert:
+                    self.renderer.text(img, "BAD POSTURE ALERT!", (50, 350), 1.5, red, 3)
 
-            leftKnee = [landmarks[mp_holistic.PoseLandmark.LEFT_KNEE.value].x,
-                        landmarks[mp_holistic.PoseLandmark.LEFT_KNEE.value].y]
+            # Draw angles on screen
+            for i, (name, angle) in enumerate(event.angles.items()):
+                color = self.angle_colors[i % len(self.angle_colors)]
+                # Only the number changes between frames; the prefix and unit are cached.
+                y = 30 + 30 * i
+                x = self.renderer.text(img, f"{name}: ", (10, y), 0.7, color, 2)
+                x = self.renderer.dynamic_text(img, f"{angle:.1f}", (x, y), 0.7, color, 2)
+                self.renderer.text(img, DEGREE_SIGN, (x, y), 0.7, color, 2)
 
-            leftHip = [landmarks[mp_holistic.PoseLandmark.LEFT_HIP.value].x,
-                       landmarks[mp_holistic.PoseLandmark.LEFT_HIP.value].y]
+        # Draw pose landmarks
+        self.renderer.skeleton(img, event.landmarks)
+        return img
 
-            leftShoulder = [landmarks[mp_holistic.PoseLandmark.LEFT_SHOULDER.value].x,
-                            landmarks[mp_holistic.PoseLandmark.LEFT_SHOULDER.value].y]
 
-            leftEar = [landmarks[mp_holistic.PoseLandmark.LEFT_EAR.value].x,
-                       landmarks[mp_holistic.PoseLandmark.LEFT_EAR.value].y]
+def run(events, sinks, overlay=None):
+    # Sends every event to every sink. With an overlay, the pipeline runs on a
+    # worker thread and the main thread (which HighGUI needs) shows only the
+    # newest frame, so drawing never holds back the sinks. 'q' stops both.
+    def publish(event):
+        for sink in sinks:
+            sink.write(event)
 
-            if all(landmark is not None for landmark in [leftKnee, leftHip, leftShoulder, leftEar]):
-                virtualPoint = [leftEar[0], leftEar[1] - 0.1]  # Normalized coords
-                angleKHS = find_angles(leftKnee, leftHip, leftShoulder)
-                angleHSE = find_angles(leftHip, leftShoulder, leftEar)
-                angleSEV = find_angles(leftShoulder, leftEar, virtualPoint)
+    if overlay is None:
+        try:
+            for event in events:
+                publish(event)
+        finally:
+            events.close()
+        return
 
-                validKHS = angleKHS >= 60 and angleKHS <= 105
-                validHSE = angleHSE >= 165
-                validSEV = angleSEV >= 165
+    stop = threading.Event()
+    display_queue = LatestQueue(maxsize=1)
+    errors = []
 
-                if validKHS and validHSE and validSEV:
-                    bad_posture_frames = 0
-                    cv2.putText(img, "GOOD POSTURE!", (350, 50), font, 1, green, 2)
+    def pipeline():
+        try:
+            for event in events:
+                if stop.is_set():
+                    break
+                publish(event)
+                display_queue.put_latest(event._replace(frame=event.frame.copy()))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            events.close()
+            stop.set()
 
-                else:
-                    bad_posture_frames += 1
+    worker = threading.Thread(target=pipeline, daemon=True)
+    worker.start()
+    try:
+        while not stop.is_set():
+            try:
+                event = display_queue.get(timeout=0.01)
+                cv2.imshow('Posture Police', overlay.draw(event.frame, event))
+            except queue.Empty:
+                pass
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                stop.set()
+    finally:
+        stop.set()
+        worker.join()
+        cv2.destroyAllWindows()
+    if errors:
+        raise errors[0]
 
-                    # Specific feedback based on which angle is wrong
-                    if not validKHS:
-                        cv2.putText(img, "SIT UP STRAIGHT!", (350, 50), font, 1, red, 2)
-                    elif not validHSE:
-                        cv2.putText(img, "FIX SHOULDER POSITION!", (350, 50), font, 1, red, 2)
-                    else:  # Only SEV is invalid
-                        cv2.putText(img, "FIX NECK POSITION!", (350, 50), font, 1, red, 2)
 
-                    # General alert if bad posture persists
-                    if bad_posture_frames > ALERT_THRESHOLD:
-                        cv2.putText(img, "BAD POSTURE ALERT!", (50, 350), font, 1.5, red, 3)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stream posture verdicts from a webcam, video file or stream.")
+    parser.add_argument("--source", default="0",
+                        help="Webcam index, video file or stream URL such as rtsp://... (default: 0)")
+    parser.add_argument("--sink", action="append", default=[],
+                        help="stdout, sqlite[:DB], serial[:PORT] or unix:PATH; repeatable "
+                             "(default: stdout when headless)")
+    parser.add_argument("--headless", action="store_true", help="Do not open a preview window")
+    parser.add_argument("--user", default="posturedetection", help="Username for the sqlite sink")
+    parser.add_argument("--backend", default=POSE_BACKEND, choices=("pose", "holistic"))
+    parser.add_argument("--model-complexity", type=int, default=POSE_MODEL_COMPLEXITY, choices=(0, 1, 2))
+    parser.add_argument("--rules", help="Posture rules file (default: posture_rules.json)")
+    return parser.parse_args(argv)
 
-                # Draw angles on screen
-                cv2.putText(img, f"KHS: {angleKHS:.1f}°", (10, 30), font, 0.7, green, 2)
-                cv2.putText(img, f"HSE: {angleHSE:.1f}°", (10, 60), font, 0.7, blue, 2)
-                cv2.putText(img, f"SEV: {angleSEV:.1f}°", (10, 90), font, 0.7, pink, 2)
 
-            # Draw pose landmarks
-            mp_drawing.draw_landmarks(
-                img,
-                results.pose_landmarks,
-                mp_holistic.POSE_CONNECTIONS,
-                landmark_drawing_spec=mp_drawing.DrawingSpec(color=green, thickness=2, circle_radius=2),
-                connection_drawing_spec=mp_drawing.DrawingSpec(color=yellow, thickness=2)
-            )
+def main(argv=None):
+    args = parse_args(argv)
+    posture_rules = load_rules(args.rules)
+    # Smoothed, debounced verdict so landmark jitter does not make the status flap.
+    posture_state = PostureStateEstimator(posture_rules)
+    sink_specs = args.sink or (["stdout"] if args.headless else [])
+    sinks = []
+    try:
+        for spec in sink_specs:
+            sinks.append(make_sink(spec, args.user))
+        frames = open_source(args.source)
+        with create_pose_estimator(args.backend, args.model_complexity) as estimator:
+            events = stream_verdicts(frames, estimator, posture_rules, posture_state)
+            run(events, sinks, None if args.headless else PostureOverlay(posture_rules))
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sink in sinks:
+            sink.close()
+    return 0
 
-        cv2.imshow('Posture Police', img)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            msg = "STOP\n"
 
-liveFeed.release()
-cv2.destroyAllWindows()
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+import tkinter as tk
+
+import cv2
+import numpy as np
+
+
+class PreviewRenderer:
+    # Draws frames into one persistent PhotoImage on a canvas. Frames are
+    # resized into a preallocated buffer and handed to Tk as raw PPM, which
+    # avoids a PNG encode/decode per frame and never recreates canvas items.
+
+    def __init__(self, canvas, width=320, height=240):
+        self.width = width
+        self.height = height
+        self.resized = np.empty((height, width, 3), dtype=np.uint8)
+        self.rgb = np.empty((height, width, 3), dtype=np.uint8)
+        self.header = f"P6 {width} {height} 255\n".encode("ascii")
+        self.photo = tk.PhotoImage(master=canvas, width=width, height=height)
+        self.image_item = canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
+        self.last_seq = None
+
+    def render(self, frame, seq):
+        # Returns False when the frame has already been shown.
+        if seq == self.last_seq:
+            return False
+        cv2.resize(frame, (self.width, self.height), dst=self.resized, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        self.photo.configure(data=self.header + self.rgb.tobytes(), format="PPM")
+        self.last_seq = seq
+        return True
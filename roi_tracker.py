@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+
+from posture_rules import load_rules
+
+
+class ROITracker:
+    # Crops the pose model input to the region around the previous frame's
+    # pose and scales it down to meet a target frame rate. The crop only
+    # moves when the person leaves its inner area, so MediaPipe's own
+    # frame-to-frame tracking sees a stable view, and it widens back to the
+    # full frame as soon as the pose is lost. The joints the posture rules
+    # measure stay inside the crop whatever their visibility.
+
+    def __init__(self, target_fps=15.0, margin=0.25, min_visibility=0.5,
+                 scales=(1.0, 0.75, 0.5, 0.35), min_input_side=192, adapt_every=30, rules=None):
+        self.target_fps = target_fps
+        self.rules = rules if rules is not None else load_rules()
+        self.margin = margin
+        self.min_visibility = min_visibility
+        self.scales = scales
+        self.min_input_side = min_input_side
+        self.adapt_every = adapt_every
+        self.roi = None  # normalized (x0, y0, x1, y1); None means the full frame
+        self.window = (0.0, 0.0, 1.0, 1.0)  # pixel-aligned (x0, y0, width, height) of the last crop
+        self.scale_index = 0
+        self.inference_time = None
+        self.frames_since_adapt = 0
+
+    @property
+    def scale(self):
+        return self.scales[self.scale_index]
+
+    def prepare(self, frame):
+        # Returns the (possibly cropped and downscaled) model input.
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self.roi or (0.0, 0.0, 1.0, 1.0)
+        px0, py0 = int(x0 * width), int(y0 * height)
+        px1, py1 = max(px0 + 1, int(np.ceil(x1 * width))), max(py0 + 1, int(np.ceil(y1 * height)))
+        self.window = (px0 / width, py0 / height, (px1 - px0) / width, (py1 - py0) / height)
+
+        crop = frame[py0:py1, px0:px1]
+        longest = max(crop.shape[:2])
+        scale = min(1.0, max(self.scale, self.min_input_side / longest))
+        if scale < 1.0:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return crop
+
+    def to_frame(self, landmarks):
+        # Maps landmarks normalized to the crop back to full-frame coordinates.
+        x0, y0, crop_width, crop_height = self.window
+        mapped = landmarks.copy()
+        mapped[:, 0] = x0 + mapped[:, 0] * crop_width
+        mapped[:, 1] = y0 + mapped[:, 1] * crop_height
+        mapped[:, 2] *= crop_width
+        return mapped
+
+    def _adapt(self, inference_time):
+        if self.inference_time is None:
+            self.inference_time = inference_time
+        else:
+            self.inference_time += 0.1 * (inference_time - self.inference_time)
+        self.frames_since_adapt += 1
+        if self.frames_since_adapt < self.adapt_every:
+            return
+
+        budget = 1.0 / self.target_fps
+        if self.inference_time > budget * 1.1 and self.scale_index < len(self.scales) - 1:
+            self.scale_index += 1
+        elif self.inference_time < budget * 0.6 and self.scale_index > 0:
+            self.scale_index -= 1
+        else:
+            return
+        self.frames_since_adapt = 0
+        self.inference_time = None
+
+    def update(self, landmarks, inference_time):
+        # landmarks are full-frame (33, 4) or None when no pose was found.
+        self._adapt(inference_time)
+        if landmarks is None:
+            self.roi = None
+            return
+
+        measured = self.rules.measured_landmarks(landmarks)
+        keep = landmarks[:, 3] >= self.min_visibility
+        keep[measured] = True
+        points = np.clip(landmarks[keep, :2], 0.0, 1.0)
+        if len(points) < len(measured) or not np.isfinite(points).all():
+            self.roi = None
+            return
+
+        bx0, by0 = points.min(axis=0).tolist()
+        bx1, by1 = points.max(axis=0).tolist()
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            inset_x, inset_y = (x1 - x0) * self.margin / 4, (y1 - y0) * self.margin / 4
+            inside = bx0 >= x0 + inset_x and by0 >= y0 + inset_y and bx1 <= x1 - inset_x and by1 <= y1 - inset_y
+            large_enough = (bx1 - bx0) * (by1 - by0) >= 0.25 * (x1 - x0) * (y1 - y0)
+            if inside and large_enough:
+                return
+
+        pad_x, pad_y = (bx1 - bx0) * self.margin, (by1 - by0) * self.margin
+        roi = (max(0.0, bx0 - pad_x), max(0.0, by0 - pad_y), min(1.0, bx1 + pad_x), min(1.0, by1 + pad_y))
+        # Not worth cropping when the person fills most of the frame.
+        self.roi = None if (roi[2] - roi[0]) * (roi[3] - roi[1]) > 0.85 else roi
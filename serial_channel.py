@@ -0,0 +1,195 @@
+import os
+import queue
+import threading
+import time
+
+import serial
+import serial.tools.list_ports
+
+BAD_POSTURE_COMMAND = "BP"
+GOOD_POSTURE_COMMAND = "GP"
+
+# USB (vendor id, product id) of Arduino boards and of the USB-serial chips
+# used on common clones; a product id of None matches any product.
+ARDUINO_USB_IDS = {
+    (0x2341, None),    # Arduino SA
+    (0x2A03, None),    # Arduino.org
+    (0x1A86, 0x7523),  # CH340
+    (0x0403, 0x6001),  # FTDI FT232R
+    (0x10C4, 0xEA60),  # Silicon Labs CP210x
+}
+
+
+def find_arduino_port(configured=None):
+    # Port from the argument or POSTURE_SERIAL_PORT, else the first port whose
+    # USB ids match a known Arduino. Returns None when nothing matches or
+    # when the configured value is "none".
+    configured = configured or os.environ.get("POSTURE_SERIAL_PORT")
+    if configured:
+        return None if configured.lower() == "none" else configured
+    for port in serial.tools.list_ports.comports():
+        if (port.vid, port.pid) in ARDUINO_USB_IDS or (port.vid, None) in ARDUINO_USB_IDS:
+            return port.device
+    return None
+
+
+class SerialChannel(threading.Thread):
+    # Owns the Arduino connection on a background thread. send() only records
+    # the wanted state; the thread writes it when it changes, repeats it as a
+    # rate-limited heartbeat, resends it if the device does not acknowledge
+    # it, and reopens the port if it drops.
+
+    def __init__(self, port, baudrate=9600, heartbeat_interval=10.0, ack_timeout=3.0,
+                 reconnect_interval=2.0, open_port=None, stats=None):
+        super().__init__(daemon=True)
+        self.port = port
+        self.stats = stats
+        self.baudrate = baudrate
+        self.heartbeat_interval = heartbeat_interval
+        self.ack_timeout = ack_timeout
+        self.reconnect_interval = reconnect_interval
+        self.open_port = open_port or self._open_serial
+        self.connection = None
+        self.desired = None
+        self.sent = None
+        self.sent_at = 0.0
+        self.acked = None
+        self.acked_at = None
+        self.commands_sent = 0
+        self.reconnects = 0
+        self.running = True
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.start()
+
+    def _open_serial(self):
+        # serial_for_url also accepts test URLs such as "loop://".
+        return serial.serial_for_url(self.port, baudrate=self.baudrate, timeout=0.1)
+
+    def send(self, command):
+        with self._lock:
+            if command == self.desired:
+                return
+            self.desired = command
+        self._wake.set()
+
+    def close(self, timeout=2.0):
+        self.running = False
+        self._wake.set()
+        self.join(timeout)
+
+    @property
+    def connected(self):
+        return self.connection is not None
+
+    def _connect(self):
+        try:
+            self.connection = self.open_port()
+            # A freshly opened port (or a reset board) knows nothing of our state.
+            self.sent = None
+            self.acked = None
+            print(f"Serial connected: {self.port}")
+        except (serial.SerialException, OSError) as e:
+            self.connection = None
+            print(f"Serial connect failed ({self.port}): {e}")
+
+    def _disconnect(self, error):
+        print(f"Serial connection lost ({self.port}): {error}")
+        try:
+            self.connection.close()
+        except (serial.SerialException, OSError):
+            pass
+        self.connection = None
+        self.reconnects += 1
+
+    def _due_command(self, now):
+        with self._lock:
+            desired = self.desired
+        if desired is None:
+            return None
+        if desired != self.sent:
+            return desired
+        if self.acked != desired and now - self.sent_at >= self.ack_timeout:
+            return desired
+        if now - self.sent_at >= self.heartbeat_interval:
+            return desired
+        return None
+
+    def _read_acks(self):
+        while self.connection.in_waiting:
+            line = self.connection.readline().decode("utf-8", errors="replace").strip()
+            if line.startswith("ACK "):
+                self.acked = line[4:]
+                self.acked_at = time.monotonic()
+            elif line:
+                print(f"Serial device: {line}")
+
+    def run(self):
+        while self.running:
+            if self.connection is None:
+                self._connect()
+                if self.connection is None:
+                    self._wake.wait(self.reconnect_interval)
+                    self._wake.clear()
+                    continue
+
+            try:
+                now = time.monotonic()
+                command = self._due_command(now)
+                if command is not None:
+                    self.connection.write(f"{command}\n".encode("utf-8"))
+                    if self.stats is not None:
+                        self.stats.record("serial_write", time.monotonic() - now)
+                    self.sent = command
+                    self.sent_at = now
+                    self.commands_sent += 1
+                self._read_acks()
+            except (serial.SerialException, OSError) as e:
+                self._disconnect(e)
+                continue
+
+            self._wake.wait(0.1)
+            self._wake.clear()
+
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except (serial.SerialException, OSError):
+                pass
+            self.connection = None
+
+
+class LoopbackSerial:
+    # In-process stand-in for the Arduino: acknowledges every command line
+    # the way arduinocode.ino does. Set fail_writes to simulate a dropped port.
+
+    def __init__(self):
+        self.is_open = True
+        self.received = []
+        self.fail_writes = False
+        self._replies = queue.Queue()
+        self._partial = b""
+
+    def write(self, data):
+        if self.fail_writes or not self.is_open:
+            raise serial.SerialException("loopback port unavailable")
+        self._partial += data
+        while b"\n" in self._partial:
+            line, self._partial = self._partial.split(b"\n", 1)
+            command = line.decode("utf-8").strip()
+            self.received.append(command)
+            self._replies.put(f"ACK {command}\n".encode("utf-8"))
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return self._replies.qsize()
+
+    def readline(self):
+        try:
+            return self._replies.get(timeout=0.1)
+        except queue.Empty:
+            return b""
+
+    def close(self):
+        self.is_open = False
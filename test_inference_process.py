@@ -0,0 +1,21 @@
+import os
+import time
+
+from inference_process import InferenceProcess
+
+
+def test_startup_failure_is_reported_to_gui(tmp_path):
+    # Without a usable source the child exits early; its error event must
+    # still reach the GUI rather than be dropped with the queue.
+    process = InferenceProcess((48, 64, 3), camera=os.path.join(tmp_path, "missing.mp4"))
+    process.start()
+    try:
+        process.process.join(60)
+        assert not process.is_alive()
+        deadline = time.monotonic() + 5
+        while process.error is None and time.monotonic() < deadline:
+            process.poll_events()
+            time.sleep(0.05)
+        assert process.error is not None
+    finally:
+        process.stop()
@@ -0,0 +1,81 @@
+import sqlite3
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from posture_db import DAY, GOOD_POSTURE, HOUR, MINUTE, RESOLUTIONS, SLOUCH_DETECTED, bucket_start, \
+    create_schema, next_bucket, record_history
+
+ZONE = "America/New_York"
+# Local midnight before the spring-forward and fall-back changes of 2024.
+DST_DAYS = ("2024-03-10", "2024-11-03")
+
+
+@pytest.fixture(autouse=True)
+def new_york_time(monkeypatch):
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset is not available on this platform")
+    monkeypatch.setenv("TZ", ZONE)
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def expected_bucket(epoch, resolution):
+    # Reference from zoneinfo: fold keeps the repeated hour apart.
+    local = datetime.fromtimestamp(epoch, ZoneInfo(ZONE))
+    if resolution == MINUTE:
+        return int(local.replace(second=0, microsecond=0).timestamp())
+    if resolution == HOUR:
+        return int(local.replace(minute=0, second=0, microsecond=0).timestamp())
+    return int(local.replace(hour=0, minute=0, second=0, microsecond=0, fold=0).timestamp())
+
+
+def around_dst_days():
+    for day in DST_DAYS:
+        midnight = int(datetime.fromisoformat(day).replace(tzinfo=ZoneInfo(ZONE)).timestamp())
+        yield from range(midnight - 86400, midnight + 2 * 86400, 397)
+
+
+def test_bucket_start_matches_local_time_across_dst():
+    for epoch in around_dst_days():
+        for resolution in RESOLUTIONS:
+            assert bucket_start(epoch, resolution) == expected_bucket(epoch, resolution), (epoch, resolution)
+
+
+def test_next_bucket_follows_day_length():
+    for day, hours in zip(DST_DAYS, (23, 25)):
+        start = bucket_start(int(datetime.fromisoformat(day).replace(tzinfo=ZoneInfo(ZONE)).timestamp()), DAY)
+        following = next_bucket(start, DAY)
+        assert following - start == hours * 3600
+        assert following == expected_bucket(start + 86400 + 7200, DAY)
+    for epoch in around_dst_days():
+        for resolution in (MINUTE, HOUR):
+            start = bucket_start(epoch, resolution)
+            assert next_bucket(start, resolution) == expected_bucket(start + RESOLUTIONS[resolution], resolution)
+
+
+def test_record_history_splits_segments_across_dst():
+    conn = sqlite3.connect(":memory:")
+    create_schema(conn)
+    fall_back = int(datetime.fromisoformat(DST_DAYS[1]).replace(tzinfo=ZoneInfo(ZONE)).timestamp())
+    # 22:00 the evening before to 03:00 after the change, which is 6 hours
+    # as 01:00-02:00 happens twice, then 10 minutes of good posture.
+    ended_at = fall_back + 4 * 3600
+    started_at = ended_at - 6 * 3600
+    record_history(conn, [("alice", ended_at, SLOUCH_DETECTED, 6 * 3600.0),
+                          ("alice", ended_at + 600, GOOD_POSTURE, 600.0)])
+    for resolution in RESOLUTIONS:
+        good, slouch, events = conn.execute(
+            "SELECT SUM(good_time), SUM(slouch_time), SUM(slouch_events) FROM posture_history "
+            "WHERE resolution = ?", (resolution,)).fetchone()
+        assert (good, slouch, events) == (600.0, 6 * 3600.0, 1)
+    days = conn.execute("SELECT bucket, slouch_time FROM posture_history WHERE resolution = ? ORDER BY bucket",
+                        (DAY,)).fetchall()
+    assert days == [(fall_back - 86400, 2 * 3600.0), (fall_back, 4 * 3600.0)]
+    hours = conn.execute("SELECT bucket FROM posture_history WHERE resolution = ? ORDER BY bucket",
+                         (HOUR,)).fetchall()
+    assert [bucket for bucket, in hours] == [started_at + i * 3600 for i in range(7)]
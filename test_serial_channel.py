@@ -0,0 +1,63 @@
+import time
+
+from serial_channel import BAD_POSTURE_COMMAND, GOOD_POSTURE_COMMAND, LoopbackSerial, SerialChannel
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def open_channel(**options):
+    ports = []
+
+    def open_port():
+        ports.append(LoopbackSerial())
+        return ports[-1]
+
+    options.setdefault("reconnect_interval", 0.05)
+    channel = SerialChannel("loopback", open_port=open_port, **options)
+    assert wait_for(lambda: channel.connected)
+    return channel, ports
+
+
+def test_only_state_changes_are_sent():
+    channel, ports = open_channel(heartbeat_interval=60.0)
+    try:
+        good, bad = GOOD_POSTURE_COMMAND, BAD_POSTURE_COMMAND
+        for command in (good, good, bad, bad, bad, good):
+            channel.send(command)
+            assert wait_for(lambda: ports[-1].received and ports[-1].received[-1] == command)
+            assert wait_for(lambda: channel.acked == command)
+        time.sleep(0.3)
+        assert ports[-1].received == [good, bad, good]
+        assert channel.commands_sent == 3
+    finally:
+        channel.close()
+
+
+def test_heartbeat_repeats_last_state():
+    channel, ports = open_channel(heartbeat_interval=0.2)
+    try:
+        channel.send(BAD_POSTURE_COMMAND)
+        assert wait_for(lambda: len(ports[-1].received) >= 3)
+        assert set(ports[-1].received) == {BAD_POSTURE_COMMAND}
+    finally:
+        channel.close()
+
+
+def test_failed_write_reconnects_and_resends_state():
+    channel, ports = open_channel(heartbeat_interval=0.2)
+    try:
+        channel.send(BAD_POSTURE_COMMAND)
+        assert wait_for(lambda: ports[0].received == [BAD_POSTURE_COMMAND])
+        ports[0].fail_writes = True
+        assert wait_for(lambda: len(ports) == 2 and ports[1].received[:1] == [BAD_POSTURE_COMMAND])
+        assert channel.reconnects == 1
+        assert not ports[0].is_open
+    finally:
+        channel.close()